@@ -0,0 +1,215 @@
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from functools import partial
+
+from downloader import PartialDownload
+from metrics import metrics
+from rate_limit import Throttled
+
+try:
+    import aiohttp
+except ImportError:
+    # Without aiohttp, downloads run on the ImageDownloader's session in the default thread pool
+    aiohttp = None
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class AsyncHttpClient:
+    """
+    Async counterpart of `ImageDownloader.download`.
+
+    With aiohttp installed, images are streamed over one aiohttp session. The `.part` files, Range
+    resumption, content hashing and extension correction are shared with the ImageDownloader through
+    `PartialDownload`, and so are its settings and CDN rate limiter. Otherwise each download runs `ImageDownloader.download` in a thread.
+    """
+
+    def __init__(self, downloader):
+        self.downloader = downloader
+        self.session = None
+
+    async def start(self):
+        if aiohttp is None:
+            logging.info("aiohttp is not installed. Async downloads run in threads.")
+            return
+        timeout = self.downloader.timeout
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        self.session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout),
+            connector=aiohttp.TCPConnector(limit=self.downloader.max_workers, limit_per_host=self.downloader.per_host),
+        )
+
+    async def _fetch(self, part, outcome):
+        while True:
+            async with self.session.get(part.url, headers=part.resume()) as response:
+                outcome.response(response.status, response.headers.get("Retry-After"))
+                if outcome.throttled:
+                    raise Throttled(self.downloader.limiter.name, outcome.retry_after)
+                if part.rejected(response.status):
+                    # The connection goes back to the pool before the request is sent again
+                    response.release()
+                    continue
+                response.raise_for_status()
+
+                with part.writer(response.status, response.headers) as write:
+                    async for chunk in response.content.iter_chunked(self.downloader.chunk_size):
+                        write(chunk)
+                return
+
+    async def download(self, url, path, labels=None):
+        """
+        Download a single URL to the given path.
+
+        Returns:
+        - A DownloadResult with the final path and size of the file and its Dropbox content hash.
+        """
+        downloader = self.downloader
+        if self.session is None:
+            return await asyncio.to_thread(downloader.download, url, path, labels)
+
+        labels = labels or {}
+        part = PartialDownload(url, path, downloader.chunk_size)
+        # Counted in the downloader's run totals, like the downloads that run in threads
+        with downloader.throughput.track():
+            for attempt in range(downloader.retries + 1):
+                try:
+                    async with downloader.limiter.async_slot() as outcome:
+                        with metrics.timed("download", **labels):
+                            await self._fetch(part, outcome)
+                            result = part.finish(downloader.fix_extensions)
+                    break
+                except Throttled:
+                    # The limiter holds the next attempt back until the CDN is ready again
+                    if attempt == downloader.retries:
+                        raise
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    # Client errors like 404 won't go away by retrying
+                    if attempt == downloader.retries or getattr(e, "status", 500) < 500:
+                        raise
+                    await asyncio.sleep(downloader.backoff_factor * 2 ** attempt)
+            downloader.throughput.add(result.size)
+        metrics.inc("download_bytes_total", part.transferred, **labels)
+        return result
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+class AsyncDropbox:
+    """
+    Async wrapper offloading every DropboxSyncBot method to a pool of `workers` threads, with an optional timeout.
+
+    A call that times out or is cancelled stops being awaited, but its thread finishes the Dropbox call.
+    """
+
+    def __init__(self, bot, workers=4, timeout=None):
+        self.bot = bot
+        self.timeout = timeout
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dropbox")
+
+    def __getattr__(self, attr):
+        method = getattr(self.bot, attr)
+
+        async def offloaded(*args, **kwargs):
+            future = asyncio.get_running_loop().run_in_executor(self.executor, partial(method, *args, **kwargs))
+            return await asyncio.wait_for(future, self.timeout)
+        return offloaded
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+class AsyncEngine:
+    """
+    Event loop on a background thread that runs the downloads and uploads of many pages concurrently.
+
+    Synchronous code, like the browser scraping, hands coroutines to `submit` and carries on. Each
+    submission has a weight, e.g. its number of images, and `submit` blocks while more than `max_pending`
+    is in flight, so the scraping can't run arbitrarily far ahead. `close` waits for everything that was
+    submitted; if that times out or is interrupted, every task is cancelled and awaited before the loop
+    stops, so no coroutine is left half-way through.
+    """
+
+    def __init__(self, downloader, bot=None, max_pending=100, upload_workers=4, upload_timeout=None):
+        self.max_pending = max_pending
+        self.pending = 0
+        self.condition = threading.Condition()
+        self.tasks = set()
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="async-engine", daemon=True)
+        self.thread.start()
+
+        self.http = AsyncHttpClient(downloader)
+        self.dropbox = AsyncDropbox(bot, upload_workers, upload_timeout) if bot is not None else None
+        self.run(self.http.start())
+
+    def run(self, coroutine, timeout=None):
+        """
+        Run a coroutine on the engine's loop and wait for its result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    async def _tracked(self, coroutine, weight):
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        try:
+            return await coroutine
+        finally:
+            self.tasks.discard(task)
+            with self.condition:
+                self.pending -= weight
+                self.condition.notify_all()
+
+    def submit(self, coroutine, weight=1):
+        """
+        Schedule a coroutine on the engine's loop without waiting for it.
+
+        Returns:
+        - A concurrent.futures.Future of the coroutine's result.
+        """
+        with self.condition:
+            # A submission heavier than max_pending is still let through once nothing else is in flight
+            while self.pending and self.pending + weight > self.max_pending:
+                self.condition.wait()
+            self.pending += weight
+        future = asyncio.run_coroutine_threadsafe(self._tracked(coroutine, weight), self.loop)
+        # Callers hand pages off without waiting for them, so a failure would otherwise go unnoticed
+        future.add_done_callback(self._log_failure)
+        return future
+
+    @staticmethod
+    def _log_failure(future):
+        if not future.cancelled() and future.exception() is not None:
+            logging.error(f"Async task failed: {future.exception()!r}")
+            metrics.inc("async_task_errors_total")
+
+    async def _drain(self):
+        while self.tasks:
+            await asyncio.gather(*list(self.tasks), return_exceptions=True)
+
+    async def _cancel_all(self):
+        for task in list(self.tasks):
+            task.cancel()
+        await self._drain()
+
+    def close(self, timeout=None):
+        """
+        Wait for every submitted coroutine, cancelling them if it takes longer than `timeout` or is interrupted.
+        """
+        try:
+            self.run(self._drain(), timeout)
+        except (concurrent.futures.TimeoutError, KeyboardInterrupt):
+            logging.warning(f"Cancelling {len(self.tasks)} unfinished async task(s).")
+            self.run(self._cancel_all())
+            raise
+        finally:
+            self.run(self.http.close())
+            if self.dropbox is not None:
+                self.dropbox.close()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
@@ -0,0 +1,147 @@
+import datetime
+import hashlib
+import itertools
+import os
+import threading
+import time
+
+import dropbox
+
+from content_hash import DropboxContentHasher
+
+PAGE_SIZE = 500
+
+
+class FakeDropbox:
+    """
+    In-memory stand-in for `dropbox.Dropbox` implementing the calls used by DropboxSyncBot.
+
+    Files are kept in memory with real `dropbox.files` metadata, listings support recursive paging and
+    cursors, and every call sleeps for `latency` seconds and is counted, so sync runs can be measured
+    without network access.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.changes = []
+        self.sessions = {}
+        self.calls = {}
+        self._ids = itertools.count(1)
+
+    def _call(self, name):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _record(self, metadata):
+        self.entries[metadata.path_lower] = metadata
+        self.changes.append(metadata)
+
+    def _ensure_folders(self, path):
+        parent = os.path.dirname(path)
+        while parent not in ("", "/") and parent.lower() not in self.entries:
+            self._record(dropbox.files.FolderMetadata(
+                name=os.path.basename(parent), id=f"id:{next(self._ids)}", path_lower=parent.lower(), path_display=parent,
+            ))
+            parent = os.path.dirname(parent)
+
+    def _store(self, path, data):
+        hasher = DropboxContentHasher()
+        hasher.update(data)
+        now = datetime.datetime.utcnow().replace(microsecond=0)
+        metadata = dropbox.files.FileMetadata(
+            name=os.path.basename(path), id=f"id:{next(self._ids)}", client_modified=now, server_modified=now,
+            rev=hashlib.sha1(data).hexdigest()[:16], size=len(data), path_lower=path.lower(), path_display=path,
+            content_hash=hasher.hexdigest(),
+        )
+        with self.lock:
+            self._ensure_folders(path)
+            self._record(metadata)
+        return metadata
+
+    def preload(self, path, data):
+        """
+        Add a file without counting an API call, e.g. to simulate an existing archive.
+        """
+        return self._store(path, data)
+
+    def _not_found(self, error):
+        raise dropbox.exceptions.ApiError("fake", error, None, None)
+
+    def files_get_metadata(self, path):
+        self._call("files_get_metadata")
+        metadata = self.entries.get(path.lower())
+        if metadata is None:
+            self._not_found(dropbox.files.GetMetadataError.path(dropbox.files.LookupError.not_found))
+        return metadata
+
+    def _list_page(self, prefix, start):
+        with self.lock:
+            matching = [
+                (index, metadata) for index, metadata in enumerate(self.changes[start:], start)
+                if metadata.path_lower.startswith(prefix + "/")
+            ]
+            end = len(self.changes)
+        page = matching[:PAGE_SIZE]
+        has_more = len(matching) > PAGE_SIZE
+        next_start = page[-1][0] + 1 if has_more else end
+        return dropbox.files.ListFolderResult(
+            entries=[metadata for _, metadata in page], cursor=f"{prefix}|{next_start}", has_more=has_more,
+        )
+
+    def files_list_folder(self, path, recursive=False):
+        self._call("files_list_folder")
+        prefix = path.lower().rstrip('/')
+        if not any(key.startswith(prefix + "/") for key in self.entries):
+            self._not_found(dropbox.files.ListFolderError.path(dropbox.files.LookupError.not_found))
+        return self._list_page(prefix, 0)
+
+    def files_list_folder_continue(self, cursor):
+        self._call("files_list_folder_continue")
+        prefix, start = cursor.rsplit('|', 1)
+        return self._list_page(prefix, int(start))
+
+    def files_upload(self, data, path, mode=None):
+        self._call("files_upload")
+        return self._store(path, data)
+
+    def files_upload_session_start(self, data, close=False):
+        self._call("files_upload_session_start")
+        session_id = f"session-{next(self._ids)}"
+        with self.lock:
+            self.sessions[session_id] = bytearray(data)
+        return dropbox.files.UploadSessionStartResult(session_id=session_id)
+
+    def files_upload_session_append_v2(self, data, cursor, close=False):
+        self._call("files_upload_session_append_v2")
+        with self.lock:
+            self.sessions[cursor.session_id].extend(data)
+
+    def files_upload_session_finish(self, data, cursor, commit):
+        self._call("files_upload_session_finish")
+        with self.lock:
+            content = bytes(self.sessions.pop(cursor.session_id) + data)
+        return self._store(commit.path, content)
+
+    def files_upload_session_finish_batch_v2(self, entries):
+        self._call("files_upload_session_finish_batch_v2")
+        results = []
+        for entry in entries:
+            with self.lock:
+                content = bytes(self.sessions.pop(entry.cursor.session_id))
+            metadata = self._store(entry.commit.path, content)
+            results.append(dropbox.files.UploadSessionFinishBatchResultEntry.success(metadata))
+        return dropbox.files.UploadSessionFinishBatchResult(entries=results)
+
+    def files_copy_v2(self, from_path, to_path):
+        self._call("files_copy_v2")
+        source = self.entries.get(from_path.lower())
+        if source is None:
+            self._not_found(dropbox.files.RelocationError.from_lookup(dropbox.files.LookupError.not_found))
+        metadata = self._store(to_path, b"")
+        metadata.size = source.size
+        metadata.content_hash = source.content_hash
+        return dropbox.files.RelocationResult(metadata=metadata)
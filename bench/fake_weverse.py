@@ -0,0 +1,216 @@
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+# Same class names as the real Weverse pages, so the scraping functions work unchanged
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<style>
+body { margin: 0; }
+.PostListItemView_post_item__XJ0uc { height: 600px; border-bottom: 1px solid #ccc; }
+.PostPreviewImageView_post_image__zLzXH { width: 300px; height: 300px; }
+</style>
+</head>
+<body>
+<h1>weverse</h1>
+<div id="posts"></div>
+<script>
+const artist = "__ARTIST__";
+const pageType = "__PAGE_TYPE__";
+const totalPosts = __TOTAL_POSTS__;
+const batchSize = __BATCH_SIZE__;
+const latencyMs = __LATENCY_MS__;
+const pinned = __PINNED__;
+const container = document.getElementById("posts");
+let nextPost = 0;
+let loading = false;
+
+function renderPost(index, isPinned) {
+    const post = document.createElement("div");
+    post.className = "PostListItemView_post_item__XJ0uc";
+    const date = document.createElement("div");
+    date.className = "PostHeaderView_date__XJXBZ";
+    date.textContent = isPinned ? "Recommended post" : `${index + 1} hours ago`;
+    const image = document.createElement("img");
+    image.className = "PostPreviewImageView_post_image__zLzXH";
+    image.src = isPinned ? `/cdn/${artist}/${pageType}/pinned.jpg?type=w670` : `/cdn/${artist}/${pageType}/${index}.jpg?type=w670`;
+    post.appendChild(date);
+    post.appendChild(image);
+    container.appendChild(post);
+}
+
+function appendBatch() {
+    const end = Math.min(nextPost + batchSize, totalPosts);
+    for (; nextPost < end; nextPost++) {
+        renderPost(nextPost, false);
+    }
+}
+
+function loadMore() {
+    if (loading || nextPost >= totalPosts) {
+        return;
+    }
+    loading = true;
+    setTimeout(() => { appendBatch(); loading = false; }, latencyMs);
+}
+
+window.addEventListener("scroll", () => {
+    if (window.innerHeight + window.scrollY >= document.body.scrollHeight - 1000) {
+        loadMore();
+    }
+});
+
+if (pinned) {
+    renderPost(-1, true);
+}
+appendBatch();
+</script>
+</body>
+</html>
+"""
+
+
+def image_url(base_url, artist, page_type, index):
+    """
+    Return the cleaned URL of a post image, as the scraper stores it.
+    """
+    return f"{base_url}/cdn/{artist}/{page_type}/{index}.jpg"
+
+
+def pinned_image_url(base_url, artist, page_type):
+    return f"{base_url}/cdn/{artist}/{page_type}/pinned.jpg"
+
+
+class FakeWeverse:
+    """
+    Local stand-in for the Weverse feed and artist pages and the image CDN.
+
+    `/<artist>/<feed|artist>` serves an infinite-scroll page that appends `batch_size` posts whenever the
+    page is scrolled near the bottom, after `page_latency` seconds. Post 0 is the newest post, and the feed
+    starts with a pinned "Recommended post". `/cdn/...` serves deterministic image bytes after
+    `cdn_latency` seconds, and `/webhook` accepts Discord webhook calls. Requests are counted per route.
+
+    With `recordings`, `/api/...` replays recorded Weverse API responses (see `replay`), so the API
+    fetch mode can run against the fake by setting its base URL to `<base_url>/api`.
+    """
+
+    def __init__(self, total_posts=200, batch_size=10, page_latency=0.2, cdn_latency=0.05, image_size=200 * 1024,
+                 recordings=None):
+        self.total_posts = total_posts
+        self.batch_size = batch_size
+        self.page_latency = page_latency
+        self.cdn_latency = cdn_latency
+        self.image_size = image_size
+        self.recordings = []
+        if recordings:
+            with open(recordings) as f:
+                self.recordings = json.load(f)["recordings"]
+        # Recordings of the active session take precedence over those without a session
+        self.session = None
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.bytes_served = 0
+        self.server = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, route, size=0):
+        with self.lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+            self.bytes_served += size
+
+    def image_bytes(self, path):
+        block = hashlib.sha256(path.encode()).digest()
+        return (block * (self.image_size // len(block) + 1))[:self.image_size]
+
+    def render_page(self, artist, page_type):
+        replacements = {
+            "__ARTIST__": artist,
+            "__PAGE_TYPE__": page_type,
+            "__TOTAL_POSTS__": str(self.total_posts),
+            "__BATCH_SIZE__": str(self.batch_size),
+            "__LATENCY_MS__": str(int(self.page_latency * 1000)),
+            "__PINNED__": "true" if page_type == "feed" else "false",
+        }
+        page = PAGE_TEMPLATE
+        for placeholder, value in replacements.items():
+            page = page.replace(placeholder, value)
+        return page.encode()
+
+    def replay(self, path, query):
+        """
+        Return the body of the recorded API response matching a request, or None if nothing was recorded for it.
+
+        A recording matches when its path is the request's and each of its params has the request's value,
+        e.g. the `after` cursor of a page. Among the matches, those of the active session win, then those
+        naming the most params. `{base_url}` in a recording is replaced with the fake's own URL, so the
+        recorded image URLs are served by its CDN.
+        """
+        matches = [
+            recording for recording in self.recordings
+            if recording["path"] == path
+            and recording.get("session") in (None, self.session)
+            and all(query.get(name) == str(value) for name, value in recording["params"].items())
+        ]
+        if not matches:
+            return None
+        recording = max(matches, key=lambda recording: (recording.get("session") is not None, len(recording["params"])))
+        return json.dumps(recording["response"]).replace("{base_url}", self.base_url).encode()
+
+    def start(self, host="127.0.0.1", port=0):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, status, body=b"", content_type="text/html"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                path = url.path
+                parts = path.strip('/').split('/')
+                if parts[0] == "api":
+                    body = fake.replay(path[len("/api"):], dict(parse_qsl(url.query)))
+                    fake._count(f"api {parts[-1]}", len(body or b""))
+                    if body is None:
+                        self._send(404)
+                    else:
+                        self._send(200, body, "application/json")
+                elif parts[0] == "cdn":
+                    time.sleep(fake.cdn_latency)
+                    body = fake.image_bytes(path)
+                    fake._count("cdn", len(body))
+                    self._send(200, body, "image/jpeg")
+                elif len(parts) == 2 and parts[1] in ("feed", "artist"):
+                    body = fake.render_page(parts[0], parts[1])
+                    fake._count("page", len(body))
+                    self._send(200, body)
+                else:
+                    fake._count("other")
+                    self._send(404)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                fake._count("webhook")
+                self._send(204)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
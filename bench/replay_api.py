@@ -0,0 +1,130 @@
+"""
+Offline check of the API fetch mode against recorded Weverse API responses.
+
+Replays `bench/recordings/weverse_api.json` from the fake Weverse site and scrapes its artist twice in
+API fetch mode, the way two consecutive runs would. The first run finds no saved images and follows the
+paging cursor through every recorded page. The second run replays a feed with new posts on top, and
+has to stop paging once it reaches the posts of the first run. The requests and new images of each run
+are compared with the recording's expectations and reported as JSON.
+
+Usage: python -m bench.replay_api --output replay_report.json
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+import requests
+
+import scraper
+from bench.fake_weverse import FakeWeverse
+from config import Config
+from context import ScraperContext
+from weverse_api import POST_LIST_PATHS, WeverseApiClient
+
+RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings", "weverse_api.json")
+ARTIST = "artist0"
+# Runs in order, by the recording session they replay
+SESSIONS = ("initial", "new_posts")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Check the API fetch mode against recorded Weverse API responses.")
+    parser.add_argument("--recordings", default=RECORDINGS, help="JSON file of recorded responses and expectations.")
+    parser.add_argument("--output", help="Write the report to this file instead of stdout.")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary working directory.")
+    return parser.parse_args(argv)
+
+
+def build_config(workdir, base_url):
+    """
+    Keep the scraper's stores in the working directory, so both runs share them and nothing else.
+    """
+    return Config(
+        artists=[ARTIST],
+        fetch_mode="api",
+        weverse_api_base=f"{base_url}/api",
+        enable_dropbox_sync=False,
+        saved_urls_db=os.path.join(workdir, "saved_urls.db"),
+        sync_journal_db=os.path.join(workdir, "sync_journal.db"),
+        content_store_db=os.path.join(workdir, "content_store.db"),
+        download_checkpoint_db=os.path.join(workdir, "download_checkpoint.db"),
+        post_marks_db=os.path.join(workdir, "post_marks.db"),
+        cdn_rate_limit=0,
+        weverse_api_rate_limit=0,
+    )
+
+
+def run_session(fake, config):
+    """
+    Scrape the artist's feed and artist page in API fetch mode, like one run of the scraper.
+
+    Returns:
+    - A dict with the list requests and new images of each page type.
+    """
+    ctx = ScraperContext(config)
+    ctx.api_client = WeverseApiClient(requests.Session(), base_url=config.weverse_api_base)
+    result = {}
+    try:
+        for page_type in ("feed", "artist"):
+            route = f"api {POST_LIST_PATHS[page_type].rsplit('/', 1)[-1]}"
+            before = fake.requests.get(route, 0)
+            images = scraper.scrape_page(ctx, None, ARTIST, page_type)
+            result[page_type] = {"requests": fake.requests.get(route, 0) - before, "images": images}
+    finally:
+        ctx.close()
+    return result
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    with open(args.recordings) as f:
+        expected = json.load(f)["expected"]
+
+    workdir = tempfile.mkdtemp(prefix="weverse_replay_")
+    # Images are downloaded relative to the working directory
+    os.chdir(workdir)
+    fake = FakeWeverse(cdn_latency=0, image_size=1024, recordings=args.recordings).start()
+    report = {"recordings": args.recordings, "runs": {}}
+    try:
+        config = build_config(workdir, fake.base_url)
+        for session in SESSIONS:
+            fake.session = None if session == "initial" else session
+            report["runs"][session] = {"actual": run_session(fake, config), "expected": expected[session]}
+    finally:
+        fake.stop()
+
+    mismatches = [
+        f"{session} {page_type}: {run['actual'][page_type]} instead of {counts}"
+        for session, run in report["runs"].items()
+        for page_type, counts in run["expected"].items()
+        if run["actual"][page_type] != counts
+    ]
+    report["ok"] = not mismatches
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+        logging.info(f"Saved replay report as: {args.output}")
+    else:
+        print(output)
+
+    if args.keep:
+        logging.info(f"Kept working directory: {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for mismatch in mismatches:
+        logging.error(f"Unexpected replay result for {mismatch}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Offline benchmark of the scrape, download and Dropbox sync path.
+
+Serves a synthetic Weverse site and image CDN locally, runs `scrape_images`, `scrape_artist_images`
+and `DropboxSyncBot.sync_folder` against it with an in-memory Dropbox, and reports wall time,
+request counts and memory as JSON.
+
+Usage: python -m bench.run --artists 2 --posts 100 --history 500 --output bench_report.json
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import scraper
+from bench.fake_dropbox import FakeDropbox
+from bench.fake_weverse import FakeWeverse, image_url, pinned_image_url
+from config import Config
+from context import ScraperContext
+from dropbox_sync import DropboxSyncBot
+from metrics import metrics
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scraper against a local fake Weverse site and Dropbox.")
+    parser.add_argument("--artists", type=int, default=2, help="Number of artists to scrape.")
+    parser.add_argument("--posts", type=int, default=50, help="Number of new posts per page.")
+    parser.add_argument("--history", type=int, default=200, help="Number of already saved posts per page.")
+    parser.add_argument("--archive", type=int, default=1000, help="Number of previously synced files per artist.")
+    parser.add_argument("--batch-size", type=int, default=10, help="Posts appended to the page per scroll.")
+    parser.add_argument("--image-size", type=int, default=200 * 1024, help="Size of each image in bytes.")
+    parser.add_argument("--page-latency", type=float, default=0.2, help="Seconds before scrolled posts appear.")
+    parser.add_argument("--cdn-latency", type=float, default=0.05, help="Seconds per image download.")
+    parser.add_argument("--dropbox-latency", type=float, default=0.02, help="Seconds per Dropbox API call.")
+    parser.add_argument("--max-scroll-times", type=int, default=200, help="Scroll limit per page.")
+    parser.add_argument("--output", help="Write the report to this file instead of stdout.")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary working directory.")
+    return parser.parse_args(argv)
+
+
+def build_config(workdir, args):
+    """
+    Keep the scraper's stores in the working directory, and every page's history within the trim limits.
+    """
+    max_urls = args.artists * (args.history + args.posts + 1)
+    return Config(
+        artists=[f"artist{index}" for index in range(args.artists)],
+        enable_dropbox_sync=False,
+        saved_urls_db=os.path.join(workdir, "saved_urls.db"),
+        sync_journal_db=os.path.join(workdir, "sync_journal.db"),
+        content_store_db=os.path.join(workdir, "content_store.db"),
+        post_marks_db=os.path.join(workdir, "post_marks.db"),
+        dropbox_cursor_cache=os.path.join(workdir, "dropbox_cursors.json"),
+        max_feed_urls=max_urls,
+        max_artist_urls=max_urls,
+        # Measure the engine rather than the pacing; the adaptive concurrency still applies
+        cdn_rate_limit=0,
+        dropbox_rate_limit=0,
+    )
+
+
+def seed_history(ctx, base_url, artists, args):
+    """
+    Record the posts older than the new ones as already saved, so scrolling stops once it reaches them.
+    """
+    for artist in artists:
+        for page_type in ("feed", "artist"):
+            urls = [image_url(base_url, artist, page_type, index) for index in range(args.posts, args.posts + args.history)]
+            if page_type == "feed":
+                urls.append(pinned_image_url(base_url, artist, page_type))
+            ctx.url_store.add(urls, page_type, artist)
+
+
+def seed_archive(dbx, config, args):
+    """
+    Create small previously synced files both locally and on the fake Dropbox.
+    """
+    for artist in config.artists:
+        for index in range(args.archive):
+            relative_path = f"{artist}/feed/archive_{index // 100}/image_{index % 100 + 1}.jpg"
+            data = f"{artist}-{index}".encode()
+            local_path = os.path.join(config.download_dir, relative_path)
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            with open(local_path, 'wb') as f:
+                f.write(data)
+            dbx.preload(f"{config.dropbox_root}/{relative_path}", data)
+
+
+def run_scrape(ctx, driver, base_url, artists, args):
+    images = 0
+    for artist in artists:
+        driver.get(f"{base_url}/{artist}/feed")
+        images += len(scraper.scrape_images(ctx, driver, artist, max_scroll_times=args.max_scroll_times))
+        driver.get(f"{base_url}/{artist}/artist")
+        images += len(scraper.scrape_artist_images(ctx, driver, artist, max_scroll_times=args.max_scroll_times))
+    return images
+
+
+def browser_heap_bytes(driver):
+    # performance.memory is only available in Chrome
+    return driver.execute_script("return performance.memory ? performance.memory.usedJSHeapSize : null;")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    workdir = tempfile.mkdtemp(prefix="weverse_bench_")
+    # Images are downloaded relative to the working directory
+    os.chdir(workdir)
+    ctx = ScraperContext(build_config(workdir, args))
+
+    fake = FakeWeverse(
+        total_posts=args.posts + args.history, batch_size=args.batch_size, page_latency=args.page_latency,
+        cdn_latency=args.cdn_latency, image_size=args.image_size,
+    ).start()
+    dbx = FakeDropbox(latency=args.dropbox_latency)
+    artists = ctx.config.artists
+    seed_history(ctx, fake.base_url, artists, args)
+    seed_archive(dbx, ctx.config, args)
+
+    report = {"parameters": vars(args), "phases": {}}
+    driver = scraper.create_driver()
+    tracemalloc.start()
+    try:
+        started = time.monotonic()
+        images = run_scrape(ctx, driver, fake.base_url, artists, args)
+        report["phases"]["scrape"] = {
+            "wall_seconds": round(time.monotonic() - started, 3),
+            "images": images,
+            "server_requests": dict(fake.requests),
+            "bytes_served": fake.bytes_served,
+            "browser_heap_bytes": browser_heap_bytes(driver),
+        }
+
+        bot = DropboxSyncBot(None, f"{fake.base_url}/webhook", dbx=dbx,
+                             cursor_cache_path=ctx.config.dropbox_cursor_cache)
+        started = time.monotonic()
+        bot.sync_folder(ctx.config.download_dir, ctx.config.dropbox_root)
+        sync_seconds = time.monotonic() - started
+        # The sync only queues the Discord embeds, delivering them is measured separately
+        started = time.monotonic()
+        bot.close()
+        report["phases"]["sync_folder"] = {
+            "wall_seconds": round(sync_seconds, 3),
+            "notifier_flush_seconds": round(time.monotonic() - started, 3),
+            "dropbox_calls": dict(dbx.calls),
+            "webhook_requests": fake.requests.get("webhook", 0),
+        }
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        driver.quit()
+        fake.stop()
+        ctx.close()
+
+    report["memory"] = {
+        "python_peak_bytes": peak,
+        # ru_maxrss is in kilobytes on Linux
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+    report["metrics"] = metrics.report()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+        logging.info(f"Saved benchmark report as: {args.output}")
+    else:
+        print(output)
+
+    if args.keep:
+        logging.info(f"Kept working directory: {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
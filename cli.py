@@ -0,0 +1,150 @@
+"""
+Command line entry point of the Weverse scraper.
+
+    python cli.py scrape    Log in, scrape every configured artist and sync the new images to Dropbox
+    python cli.py sync      Sync the downloaded images to Dropbox without opening a browser
+    python cli.py trim      Trim the saved URL index to MAX_FEED_URLS and MAX_ARTIST_URLS
+    python cli.py bench     Run the offline benchmark (see `python cli.py bench --help`)
+
+Only the modules a command needs are imported, so `sync` and `trim` never load Selenium or Chrome.
+"""
+import argparse
+import logging
+import os
+import time
+
+from config import Config
+from context import ScraperContext
+from metrics import metrics
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def sync_dropbox(ctx, full_reconcile=False):
+    """
+    Sync whatever hasn't been synced yet, or every artist's whole folder with `full_reconcile`.
+    """
+    config = ctx.config
+    if full_reconcile:
+        for artist in config.artists:
+            local_directory = f"./{config.download_dir}/{artist}"
+            dropbox_directory = f"{config.dropbox_root}/{artist}"
+
+            try:
+                logging.info(f"Starting Dropbox sync for artist {artist}...")
+                started = time.time()
+                ctx.bot.sync_folder(local_directory, dropbox_directory)
+                # The reconcile uploaded the artist's pending files too, so the next incremental sync skips them
+                synced = ctx.sync_journal.mark_folder_synced(local_directory, before=started)
+                logging.info(f"Completed Dropbox sync for artist {artist}, {synced} journal entries marked as synced.")
+            except Exception as e:
+                error_title = f"Error for Artist: {artist}"
+                error_description = f"Error during Dropbox sync: {e}"
+                logging.error(f"{error_title} - {error_description}")
+                ctx.send_discord_alert(error_title, error_description)
+    else:
+        try:
+            logging.info("Starting Dropbox sync of the files downloaded since the last sync...")
+            ctx.bot.sync_journal(ctx.sync_journal, config.download_dir, config.dropbox_root)
+            logging.info("Completed Dropbox sync.")
+        except Exception as e:
+            error_title = "Error during Dropbox Sync"
+            error_description = f"Error during Dropbox sync: {e}"
+            logging.error(f"{error_title} - {error_description}")
+            ctx.send_discord_alert(error_title, error_description)
+
+
+def write_metrics(ctx):
+    # Save the timing metrics of this run
+    metrics.write_json(os.path.join(ctx.config.metrics_report_dir, f"{ctx.execution_timestamp.rstrip('/')}.json"))
+    if ctx.config.metrics_textfile:
+        metrics.write_textfile(ctx.config.metrics_textfile)
+
+
+def command_scrape(ctx, args):
+    import scraper
+
+    driver = scraper.create_driver(user_data_dir=ctx.config.chrome_profile_dir)
+    try:
+        if scraper.ensure_logged_in(ctx, driver):
+            logging.info("Successfully logged in!")
+            scraper.scrape_all(ctx, driver)
+        else:
+            logging.error("Login failed. Skipping scraping.")
+
+        if ctx.config.enable_dropbox_sync:
+            sync_dropbox(ctx, ctx.config.full_dropbox_reconcile)
+        else:
+            logging.info("Dropbox sync is DISABLED.")
+        write_metrics(ctx)
+    finally:
+        driver.close()
+
+
+def command_sync(ctx, args):
+    sync_dropbox(ctx, args.full or ctx.config.full_dropbox_reconcile)
+    write_metrics(ctx)
+
+
+def command_trim(ctx, args):
+    for page_type in ("feed", "artist"):
+        ctx.url_store.trim(page_type, max_urls=ctx.config.max_urls(page_type))
+        logging.info(f"Kept {ctx.url_store.count(page_type)} saved {page_type} URLs.")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Scrape Weverse images and sync them to Dropbox.")
+    parser.add_argument("--env-file", default=".env", help="File to load environment variables from.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    scrape = subcommands.add_parser("scrape", help="Scrape the configured artists and sync the new images.")
+    scrape.add_argument("--artists", help="Comma-separated artists to scrape instead of ARTISTS.")
+    scrape.add_argument("--no-sync", action="store_true", help="Don't sync to Dropbox after scraping.")
+    scrape.add_argument("--daemon", action="store_true", help="Keep polling the pages, like DAEMON_MODE.")
+    scrape.set_defaults(handler=command_scrape)
+
+    sync = subcommands.add_parser("sync", help="Sync the downloaded images to Dropbox.")
+    sync.add_argument("--full", action="store_true", help="Compare every artist's whole folder with Dropbox.")
+    sync.add_argument("--artists", help="Comma-separated artists to reconcile with --full instead of ARTISTS.")
+    sync.set_defaults(handler=command_sync)
+
+    trim = subcommands.add_parser("trim", help="Trim the saved URL index.")
+    trim.set_defaults(handler=command_trim)
+
+    # The benchmark parses its own arguments
+    subcommands.add_parser("bench", help="Run the offline benchmark.", add_help=False)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, extra_args = parser.parse_known_args(argv)
+
+    # The benchmark builds its own configuration
+    if args.command == "bench":
+        from bench.run import main as run_bench
+        run_bench(extra_args)
+        return
+    if extra_args:
+        parser.error(f"unrecognized arguments: {' '.join(extra_args)}")
+
+    from dotenv import load_dotenv
+    load_dotenv(args.env_file)
+
+    overrides = {}
+    if getattr(args, "artists", None):
+        overrides["artists"] = [artist.strip() for artist in args.artists.split(',') if artist.strip()]
+    if getattr(args, "no_sync", False):
+        overrides["enable_dropbox_sync"] = False
+    if getattr(args, "daemon", False):
+        overrides["daemon_mode"] = True
+    ctx = ScraperContext(Config.from_env(**overrides))
+
+    try:
+        args.handler(ctx, args)
+    finally:
+        ctx.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import os
+
+
+def _flag(environ, name, default):
+    return environ.get(name, str(default)).lower() == "true"
+
+
+def _int(environ, name, default):
+    # Empty values in the .env file fall back to the default
+    return int(environ.get(name) or default)
+
+
+def _float(environ, name, default):
+    return float(environ.get(name) or default)
+
+
+def _names(environ, name):
+    return [value.strip() for value in environ.get(name, "").split(',') if value.strip()]
+
+
+class Config:
+    """
+    Settings of a run.
+
+    The defaults below can be overridden with keyword arguments, so the scraping functions can be
+    reused from other processes and benchmarks, or read from the environment with `from_env`.
+    """
+
+    # Weverse login
+    email = None
+    password = None
+    session_cache_key = None
+    session_cache_file = "session_cache.bin"
+    chrome_profile_dir = None
+
+    # Pages to scrape
+    artists = ()
+    skip_feed_artists = frozenset()
+    skip_artist_page_artists = frozenset()
+    fetch_mode = "browser"
+    weverse_api_base = "https://global.apis.naver.com/weverse/wevweb"
+    weverse_api_hmac_key = None
+    scrape_workers = 1
+    resolve_media = False
+    media_resolve_workers = 4
+    stop_after_known_posts = 3
+    backfill_mode = False
+    backfill_max_scrolls = 10000
+    pipeline_mode = False
+    pipeline_queue_size = 100
+    async_mode = False
+    async_page_timeout = 0
+    async_upload_timeout = 0
+    daemon_mode = False
+    daemon_min_interval = 5 * 60
+    daemon_max_interval = 6 * 3600
+
+    # Local state
+    download_dir = "downloaded_images"
+    screenshot_dir = "screenshots"
+    saved_urls_db = "saved_urls.db"
+    sync_journal_db = "sync_journal.db"
+    content_store_db = "content_store.db"
+    download_checkpoint_db = "download_checkpoint.db"
+    media_cache_db = "media_cache.db"
+    post_marks_db = "post_marks.db"
+    max_feed_urls = 1000
+    max_artist_urls = 1000
+
+    # Image downloads
+    download_workers = 8
+    download_per_host = 4
+    download_timeout = 30.0
+    download_retries = 3
+
+    # Post-processing of downloaded images; 0 workers means one per core
+    postprocess_images = False
+    postprocess_workers = 0
+    thumbnail_size = 320
+
+    # Dropbox sync and alerts
+    enable_dropbox_sync = True
+    full_dropbox_reconcile = False
+    dropbox_token = None
+    dropbox_root = "/weverse"
+    dropbox_upload_workers = 4
+    dropbox_cursor_cache = "dropbox_cursors.json"
+    dropbox_chunk_size = 8 * 1024 * 1024
+    discord_webhook_url = None
+
+    # Requests per second to each destination; the concurrency adapts up to the worker counts above
+    cdn_rate_limit = 20.0
+    weverse_api_rate_limit = 5.0
+    dropbox_rate_limit = 10.0
+    discord_rate_limit = 2.0
+
+    # Metrics
+    metrics_report_dir = "reports"
+    metrics_textfile = None
+    metrics_port = 0
+
+    def __init__(self, **settings):
+        for name, value in settings.items():
+            if not hasattr(Config, name) or callable(getattr(Config, name)):
+                raise TypeError(f"Unknown setting: {name}")
+            setattr(self, name, value)
+
+    def max_urls(self, page_type):
+        return self.max_feed_urls if page_type == "feed" else self.max_artist_urls
+
+    @classmethod
+    def from_env(cls, environ=None, **overrides):
+        """
+        Read the settings from environment variables named like the settings in upper case.
+        """
+        environ = os.environ if environ is None else environ
+        settings = dict(
+            email=environ.get("EMAIL"),
+            password=environ.get("PASSWORD"),
+            session_cache_key=environ.get("SESSION_CACHE_KEY") or None,
+            session_cache_file=environ.get("SESSION_CACHE_FILE", cls.session_cache_file),
+            chrome_profile_dir=environ.get("CHROME_PROFILE_DIR") or None,
+            artists=_names(environ, "ARTISTS"),
+            skip_feed_artists=frozenset(_names(environ, "SKIP_FEED_ARTISTS")),
+            skip_artist_page_artists=frozenset(_names(environ, "SKIP_ARTIST_PAGE_ARTISTS")),
+            fetch_mode=environ.get("FETCH_MODE", cls.fetch_mode).lower(),
+            weverse_api_base=environ.get("WEVERSE_API_BASE") or cls.weverse_api_base,
+            weverse_api_hmac_key=environ.get("WEVERSE_API_HMAC_KEY") or None,
+            scrape_workers=_int(environ, "SCRAPE_WORKERS", cls.scrape_workers),
+            resolve_media=_flag(environ, "RESOLVE_MEDIA", cls.resolve_media),
+            media_resolve_workers=_int(environ, "MEDIA_RESOLVE_WORKERS", cls.media_resolve_workers),
+            stop_after_known_posts=_int(environ, "STOP_AFTER_KNOWN_POSTS", cls.stop_after_known_posts),
+            backfill_mode=_flag(environ, "BACKFILL_MODE", cls.backfill_mode),
+            backfill_max_scrolls=_int(environ, "BACKFILL_MAX_SCROLLS", cls.backfill_max_scrolls),
+            pipeline_mode=_flag(environ, "PIPELINE_MODE", cls.pipeline_mode),
+            pipeline_queue_size=_int(environ, "PIPELINE_QUEUE_SIZE", cls.pipeline_queue_size),
+            async_mode=_flag(environ, "ASYNC_MODE", cls.async_mode),
+            async_page_timeout=_float(environ, "ASYNC_PAGE_TIMEOUT", cls.async_page_timeout),
+            async_upload_timeout=_float(environ, "ASYNC_UPLOAD_TIMEOUT", cls.async_upload_timeout),
+            daemon_mode=_flag(environ, "DAEMON_MODE", cls.daemon_mode),
+            daemon_min_interval=_int(environ, "DAEMON_MIN_INTERVAL", cls.daemon_min_interval),
+            daemon_max_interval=_int(environ, "DAEMON_MAX_INTERVAL", cls.daemon_max_interval),
+            saved_urls_db=environ.get("SAVED_URLS_DB", cls.saved_urls_db),
+            sync_journal_db=environ.get("SYNC_JOURNAL_DB", cls.sync_journal_db),
+            content_store_db=environ.get("CONTENT_STORE_DB", cls.content_store_db),
+            download_checkpoint_db=environ.get("DOWNLOAD_CHECKPOINT_DB", cls.download_checkpoint_db),
+            media_cache_db=environ.get("MEDIA_CACHE_DB", cls.media_cache_db),
+            post_marks_db=environ.get("POST_MARKS_DB", cls.post_marks_db),
+            max_feed_urls=_int(environ, "MAX_FEED_URLS", cls.max_feed_urls),
+            max_artist_urls=_int(environ, "MAX_ARTIST_URLS", cls.max_artist_urls),
+            download_workers=_int(environ, "DOWNLOAD_WORKERS", cls.download_workers),
+            download_per_host=_int(environ, "DOWNLOAD_PER_HOST", cls.download_per_host),
+            download_timeout=_float(environ, "DOWNLOAD_TIMEOUT", cls.download_timeout),
+            download_retries=_int(environ, "DOWNLOAD_RETRIES", cls.download_retries),
+            postprocess_images=_flag(environ, "POSTPROCESS_IMAGES", cls.postprocess_images),
+            postprocess_workers=_int(environ, "POSTPROCESS_WORKERS", cls.postprocess_workers),
+            thumbnail_size=_int(environ, "THUMBNAIL_SIZE", cls.thumbnail_size),
+            enable_dropbox_sync=_flag(environ, "ENABLE_DROPBOX_SYNC", cls.enable_dropbox_sync),
+            full_dropbox_reconcile=_flag(environ, "FULL_DROPBOX_RECONCILE", cls.full_dropbox_reconcile),
+            dropbox_token=environ.get("DROPBOX_TOKEN"),
+            dropbox_upload_workers=_int(environ, "DROPBOX_UPLOAD_WORKERS", cls.dropbox_upload_workers),
+            dropbox_cursor_cache=environ.get("DROPBOX_CURSOR_CACHE", cls.dropbox_cursor_cache),
+            dropbox_chunk_size=_int(environ, "DROPBOX_CHUNK_SIZE", cls.dropbox_chunk_size),
+            discord_webhook_url=environ.get("DISCORD_WEBHOOK_URL"),
+            cdn_rate_limit=_float(environ, "CDN_RATE_LIMIT", cls.cdn_rate_limit),
+            weverse_api_rate_limit=_float(environ, "WEVERSE_API_RATE_LIMIT", cls.weverse_api_rate_limit),
+            dropbox_rate_limit=_float(environ, "DROPBOX_RATE_LIMIT", cls.dropbox_rate_limit),
+            discord_rate_limit=_float(environ, "DISCORD_RATE_LIMIT", cls.discord_rate_limit),
+            metrics_report_dir=environ.get("METRICS_REPORT_DIR", cls.metrics_report_dir),
+            metrics_textfile=environ.get("METRICS_TEXTFILE") or None,
+            metrics_port=_int(environ, "METRICS_PORT", cls.metrics_port),
+        )
+        settings.update(overrides)
+        return cls(**settings)
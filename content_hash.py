@@ -0,0 +1,48 @@
+import hashlib
+
+# Dropbox hashes files in blocks of 4 MiB
+BLOCK_SIZE = 4 * 1024 * 1024
+
+
+class DropboxContentHasher:
+    """
+    Incremental implementation of the Dropbox content hash.
+
+    The file is split into 4 MiB blocks, each block is hashed with SHA-256, and the result is the
+    SHA-256 of the concatenated block hashes. Computing it while a file streams in allows comparing
+    local files with the `content_hash` of Dropbox metadata without reading them again.
+    """
+
+    def __init__(self):
+        self._overall = hashlib.sha256()
+        self._block = hashlib.sha256()
+        self._block_pos = 0
+
+    def update(self, data):
+        view = memoryview(data)
+        while view:
+            if self._block_pos == BLOCK_SIZE:
+                self._overall.update(self._block.digest())
+                self._block = hashlib.sha256()
+                self._block_pos = 0
+            part = view[:BLOCK_SIZE - self._block_pos]
+            self._block.update(part)
+            self._block_pos += len(part)
+            view = view[len(part):]
+
+    def hexdigest(self):
+        overall = self._overall.copy()
+        if self._block_pos > 0:
+            overall.update(self._block.digest())
+        return overall.hexdigest()
+
+
+def file_content_hash(path, chunk_size=1024 * 1024):
+    """
+    Compute the Dropbox content hash of a file on disk.
+    """
+    hasher = DropboxContentHasher()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
@@ -0,0 +1,80 @@
+import os
+import logging
+import sqlite3
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class ContentStore:
+    """
+    Persistent index of downloaded files by content hash, shared across artists and page types.
+
+    The same photo often appears on both the feed and the artist page, or under different CDN paths.
+    When a download turns out to have the same content as a file downloaded before, the new file is
+    replaced by a hardlink to the existing one, so it takes no extra disk space.
+    """
+
+    def __init__(self, path="content_store.db"):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS contents (
+                content_hash TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                added_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def lookup(self, content_hash):
+        """
+        Return the path of an existing file with the given content hash, or None.
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT path FROM contents WHERE content_hash = ?", (content_hash,)).fetchone()
+        if row is None or not os.path.exists(row[0]):
+            return None
+        return row[0]
+
+    def deduplicate(self, path, size, content_hash):
+        """
+        Register a newly downloaded file, or hardlink it to an existing file with the same content.
+
+        Returns:
+        - The path of the original file if the new file is a duplicate, otherwise None.
+        """
+        path = os.path.normpath(path)
+        with self.lock:
+            original_path = self.lookup(content_hash)
+            if original_path is None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO contents (content_hash, path, size, added_at) VALUES (?, ?, ?, ?)",
+                    (content_hash, path, size, time.time()),
+                )
+                self.conn.commit()
+                return None
+
+        if original_path == path:
+            return None
+
+        temp_path = f"{path}.link"
+        try:
+            os.link(original_path, temp_path)
+            os.replace(temp_path, path)
+        except OSError as e:
+            # Hardlinks aren't available on every filesystem; keep the duplicate copy in that case
+            logging.warning(f"Could not hardlink {path} to {original_path}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        else:
+            logging.info(f"{path} is a duplicate of {original_path}, replaced it with a hardlink.")
+        return original_path
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
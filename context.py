@@ -0,0 +1,212 @@
+import logging
+import os
+import threading
+from datetime import datetime
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def new_execution_timestamp():
+    return datetime.now().strftime("%Y%m%d_%H%M%S/")
+
+
+class ScraperContext:
+    """
+    The configuration of a run and the resources shared by the scraping functions.
+
+    The stores, the download engine, the Dropbox client and the session cache are only created, and
+    their dependencies only imported, when they are first used. A sync run therefore never loads the
+    browser code, and a scrape run without Dropbox sync never imports the Dropbox SDK.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        # Every run, and every daemon poll, downloads into its own timestamped directory
+        self.execution_timestamp = new_execution_timestamp()
+        # Set by the scrape command when the API fetch mode, the pipeline or async mode or media resolution is enabled
+        self.api_client = None
+        self.pipeline = None
+        self.async_engine = None
+        self.media_resolver = None
+        self.image_indexes = {}
+        self.image_indexes_lock = threading.Lock()
+        # Pages whose unfinished downloads from an earlier run have already been picked up
+        self.resumed_pages = set()
+        # Image URLs handed to a download that hasn't finished yet, so a later daemon poll doesn't start them again
+        self.downloads_in_flight = set()
+        self.downloads_in_flight_lock = threading.Lock()
+        # Post IDs of the media URLs waiting to be downloaded, for the post-processing manifest
+        self.media_posts = {}
+        self._resources = {}
+        self._lock = threading.Lock()
+        self.configure_rate_limits()
+
+    def configure_rate_limits(self):
+        """
+        Set up the shared rate limiter of each destination with the rates and worker counts of the configuration.
+        """
+        from rate_limit import rate_limits
+        rate_limits.configure("cdn", rate=self.config.cdn_rate_limit, max_concurrency=self.config.download_workers)
+        rate_limits.configure("weverse_api", rate=self.config.weverse_api_rate_limit,
+                              max_concurrency=self.config.media_resolve_workers)
+        rate_limits.configure("dropbox", rate=self.config.dropbox_rate_limit,
+                              max_concurrency=self.config.dropbox_upload_workers)
+        rate_limits.configure("discord", rate=self.config.discord_rate_limit)
+
+    def _resource(self, name, factory):
+        # Resources may first be used from several worker threads at once
+        with self._lock:
+            if name not in self._resources:
+                self._resources[name] = factory()
+            return self._resources[name]
+
+    @property
+    def screenshot_dir(self):
+        return os.path.join(self.config.screenshot_dir, self.execution_timestamp)
+
+    def directory_for(self, artist, page_type):
+        """
+        Return the directory that new images of a page are downloaded into during this run.
+        """
+        return f"{self.config.download_dir}/{artist}/{page_type}/{self.execution_timestamp}"
+
+    @property
+    def url_store(self):
+        def create():
+            from url_store import SeenUrlStore
+            # Persistent index of already downloaded image URLs, seeded from the legacy text files if they exist
+            store = SeenUrlStore(self.config.saved_urls_db)
+            store.import_legacy_file("feed")
+            store.import_legacy_file("artist")
+            return store
+        return self._resource("url_store", create)
+
+    @property
+    def sync_journal(self):
+        def create():
+            from sync_journal import SyncJournal
+            return SyncJournal(self.config.sync_journal_db)
+        return self._resource("sync_journal", create)
+
+    @property
+    def content_store(self):
+        def create():
+            from content_store import ContentStore
+            return ContentStore(self.config.content_store_db)
+        return self._resource("content_store", create)
+
+    @property
+    def checkpoint(self):
+        def create():
+            from download_checkpoint import DownloadCheckpoint
+            return DownloadCheckpoint(self.config.download_checkpoint_db)
+        return self._resource("checkpoint", create)
+
+    @property
+    def post_marks(self):
+        def create():
+            from stop_condition import PostMarks
+            return PostMarks(self.config.post_marks_db)
+        return self._resource("post_marks", create)
+
+    @property
+    def downloader(self):
+        def create():
+            from downloader import ImageDownloader
+            return ImageDownloader(
+                max_workers=self.config.download_workers,
+                per_host=self.config.download_per_host,
+                timeout=self.config.download_timeout,
+                retries=self.config.download_retries,
+                fix_extensions=self.config.postprocess_images,
+            )
+        return self._resource("downloader", create)
+
+    @property
+    def postprocessor(self):
+        # Resolved first, as resources can't be created from inside another resource's factory
+        sync_journal = self.sync_journal
+
+        def create():
+            from postprocess import PostProcessor
+            return PostProcessor(self.config.postprocess_workers, thumbnail_size=self.config.thumbnail_size,
+                                 journal=sync_journal)
+        return self._resource("postprocessor", create)
+
+    @property
+    def bot(self):
+        # Resolved first, as resources can't be created from inside another resource's factory
+        notifier = self.notifier
+
+        def create():
+            from dropbox_sync import DropboxSyncBot
+            return DropboxSyncBot(
+                self.config.dropbox_token,
+                self.config.discord_webhook_url,
+                upload_workers=self.config.dropbox_upload_workers,
+                cursor_cache_path=self.config.dropbox_cursor_cache,
+                chunk_size=self.config.dropbox_chunk_size,
+                notifier=notifier,
+            )
+        return self._resource("bot", create)
+
+    @property
+    def notifier(self):
+        def create():
+            from discord_notifier import DiscordNotifier
+            return DiscordNotifier(self.config.discord_webhook_url)
+        return self._resource("notifier", create)
+
+    @property
+    def session_cache(self):
+        """
+        The encrypted login session cache, or None if no SESSION_CACHE_KEY is configured.
+        """
+        if not self.config.session_cache_key:
+            return None
+
+        def create():
+            from session_cache import SessionCache
+            return SessionCache(self.config.session_cache_file, self.config.session_cache_key)
+        return self._resource("session_cache", create)
+
+    def send_discord_alert(self, title, description):
+        """
+        Queue an alert message to a Discord channel via webhook in the form of an embed.
+
+        The alert is sent from the notifier's background thread, and delivered at the latest when the context is closed.
+
+        Args:
+        - title: The title of the embed.
+        - description: The description/content of the embed.
+        """
+        if not self.config.discord_webhook_url:
+            logging.warning(f"No Discord webhook configured. Alert not sent: {title} - {description}")
+            return
+
+        self.notifier.send({
+            'title': title,
+            'description': description,
+            'color': 16711680  # Red color for error
+        })
+        logging.info(f"Queued alert to Discord: {title} - {description}")
+
+    def close(self):
+        """
+        Close every resource that was created, and the API clients.
+        """
+        if self.async_engine is not None:
+            engine, self.async_engine = self.async_engine, None
+            engine.close()
+        if self.api_client is not None:
+            self.api_client.close()
+        if self.media_resolver is not None:
+            self.media_resolver.client.close()
+            self.media_resolver.close()
+        with self._lock:
+            resources, self._resources = self._resources, {}
+        # The notifier goes last, so it delivers the alerts about anything that went wrong before
+        for name in ("downloader", "postprocessor", "url_store", "sync_journal", "content_store", "checkpoint",
+                     "post_marks", "notifier"):
+            if name in resources:
+                resources[name].close()
@@ -0,0 +1,203 @@
+import logging
+import queue
+import threading
+import time
+
+import requests
+
+from metrics import metrics
+from rate_limit import rate_limits
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Discord accepts at most 10 embeds, and 6000 characters of embed text, per webhook message
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_MESSAGE_CHARS = 6000
+MAX_FIELD_CHARS = 1024
+
+# Marker asking the worker to send what it has collected without waiting any longer
+_FLUSH = object()
+
+
+def _embed_chars(embed):
+    return len(embed.get("title", "")) + len(embed.get("description", "")) + sum(
+        len(field["name"]) + len(field["value"]) for field in embed.get("fields", [])
+    )
+
+
+def _link_list(directories):
+    """
+    Format directories as one Markdown link per line, cut off to fit in an embed field.
+    """
+    lines = []
+    length = 0
+    for index, (directory_name, url) in enumerate(directories):
+        line = f"[{directory_name}]({url})"
+        remaining = len(directories) - index - 1
+        # Unless this is the last line, keep room for the line counting the directories after it
+        needed = len(line) + (1 + len(f"... and {remaining} more") if remaining else 0)
+        if length + needed > MAX_FIELD_CHARS:
+            lines.append(f"... and {remaining + 1} more")
+            break
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines)
+
+
+def directory_embed(title, artist, page_type, directories):
+    """
+    Build the embed announcing one or more new directories of an artist's page.
+
+    Args:
+    - title: The title of the embed.
+    - artist: The artist the directories belong to.
+    - page_type: The page type the directories belong to.
+    - directories: A list of (directory name, Dropbox link) tuples.
+    """
+    if len(directories) == 1:
+        directory_name, url = directories[0]
+        detail_fields = [
+            {"name": "Directory Name", "value": directory_name, "inline": False},
+            {"name": "Link", "value": f"[Open in Dropbox]({url})", "inline": False},
+        ]
+    else:
+        title = f"{title} ({len(directories)} directories)"
+        detail_fields = [{"name": "Directories", "value": _link_list(directories), "inline": False}]
+
+    return {
+        "title": title,
+        "color": 3066993,
+        "fields": [
+            {"name": "Artist", "value": artist, "inline": False},
+            {"name": "Page Type", "value": page_type, "inline": False},
+        ] + detail_fields,
+    }
+
+
+class DiscordNotifier:
+    """
+    Background queue of Discord webhook notifications.
+
+    Sending a notification only puts it on a queue, so syncing and scraping never wait for Discord. A
+    worker thread collects the notifications that arrive within `linger` seconds, merges the new
+    directories of the same artist, page type and title into one embed, and sends the embeds in as few
+    webhook messages as Discord allows, paced by the shared Discord rate limiter. `flush` sends
+    whatever is queued right away and waits until it has been delivered.
+    """
+
+    def __init__(self, webhook_url, linger=2.0, limiter=None):
+        self.webhook_url = webhook_url
+        self.linger = linger
+        self.limiter = limiter or rate_limits.get("discord")
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def _put(self, item):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="discord-notifier", daemon=True)
+                self.thread.start()
+        self.queue.put(item)
+
+    def send(self, embed):
+        """
+        Queue an embed to be sent as is, e.g. an alert.
+        """
+        if not self.webhook_url:
+            logging.warning(f"No Discord webhook configured. Notification not sent: {embed.get('title')}")
+            return
+        self._put((None, embed))
+
+    def send_directory(self, title, artist, page_type, directory_name, url):
+        """
+        Queue the announcement of a new directory, to be merged with the other new directories of the same page.
+        """
+        if not self.webhook_url:
+            return
+        self._put(((title, artist, page_type), (directory_name, url)))
+
+    def _collect(self):
+        items = [self.queue.get()]
+        deadline = time.monotonic() + self.linger
+        while items[-1] is not _FLUSH:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                items.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return items
+
+    def _embeds(self, items):
+        # Embeds are kept in the order their first notification arrived
+        embeds = []
+        directories = {}
+        for item in items:
+            if item is _FLUSH:
+                continue
+            key, value = item
+            if key is None:
+                embeds.append(value)
+            elif key in directories:
+                directories[key].append(value)
+            else:
+                directories[key] = [value]
+                embeds.append(key)
+        return [
+            directory_embed(*embed, directories[embed]) if isinstance(embed, tuple) else embed
+            for embed in embeds
+        ]
+
+    def _messages(self, embeds):
+        message = []
+        chars = 0
+        for embed in embeds:
+            embed_chars = _embed_chars(embed)
+            if message and (len(message) == MAX_EMBEDS_PER_MESSAGE or chars + embed_chars > MAX_MESSAGE_CHARS):
+                yield message
+                message = []
+                chars = 0
+            message.append(embed)
+            chars += embed_chars
+        if message:
+            yield message
+
+    def _deliver(self, items):
+        notifications = sum(1 for item in items if item is not _FLUSH)
+        for message in self._messages(self._embeds(items)):
+            try:
+                response = self.limiter.request(requests.post, self.webhook_url, json={"embeds": message})
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                logging.error(f"Failed to send {len(message)} embed(s) to Discord: {e}")
+                metrics.inc("discord_errors_total")
+                continue
+            metrics.inc("discord_messages_total")
+            logging.info(f"Sent {len(message)} embed(s) to Discord, code {response.status_code}.")
+        metrics.inc("discord_notifications_total", notifications)
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            try:
+                self._deliver(items)
+            except Exception as e:
+                logging.error(f"Failed to deliver Discord notifications: {e}")
+            finally:
+                for _ in items:
+                    self.queue.task_done()
+
+    def flush(self):
+        """
+        Send the queued notifications now and wait until they have been delivered.
+        """
+        if self.thread is None:
+            return
+        self.queue.put(_FLUSH)
+        self.queue.join()
+
+    def close(self):
+        # The worker is a daemon thread, so delivering what is queued is all that is left to do
+        self.flush()
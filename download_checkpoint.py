@@ -0,0 +1,158 @@
+import os
+import logging
+import sqlite3
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class DownloadCheckpoint:
+    """
+    Persistent checkpoint of the images each page is downloading.
+
+    Before downloading, the new images of an artist's page are recorded together with the directory
+    and file name each one is saved to, and every image is marked as done as soon as it has been
+    saved. If the process dies partway through, the next run finds the unfinished images here and
+    downloads them into the same directory under the same names, instead of downloading them again
+    into a new directory. Images that keep failing are given up after `max_attempts` tries.
+    """
+
+    def __init__(self, path="download_checkpoint.db", max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS batches (
+                artist TEXT NOT NULL,
+                page_type TEXT NOT NULL,
+                directory TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (artist, page_type)
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                artist TEXT NOT NULL,
+                page_type TEXT NOT NULL,
+                url TEXT NOT NULL,
+                path TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                done INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (artist, page_type, url)
+            )
+        """)
+        self.conn.commit()
+
+    def directory(self, artist, page_type):
+        """
+        Return the directory the page's unfinished download started in, or None if the page has none.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT directory FROM batches WHERE artist = ? AND page_type = ?", (artist, page_type)
+            ).fetchone()
+        return row[0] if row else None
+
+    def count(self, artist, page_type):
+        """
+        Return the number of images recorded for the page's unfinished download.
+        """
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM images WHERE artist = ? AND page_type = ?", (artist, page_type)
+            ).fetchone()[0]
+
+    def recorded(self, artist, page_type, urls):
+        """
+        Return the subset of the given image URLs that are already recorded for the page's unfinished download.
+        """
+        with self.lock:
+            return {
+                url for url in urls
+                if self.conn.execute(
+                    "SELECT 1 FROM images WHERE artist = ? AND page_type = ? AND url = ?", (artist, page_type, url)
+                ).fetchone()
+            }
+
+    def add(self, artist, page_type, directory, jobs):
+        """
+        Record images to download for a page.
+
+        Args:
+        - artist: The artist the images belong to.
+        - page_type: The page type the images were found on.
+        - directory: The directory of the download. Ignored if the page already has an unfinished download.
+        - jobs: An iterable of (url, path) tuples.
+        """
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO batches (artist, page_type, directory, created_at) VALUES (?, ?, ?, ?)",
+                (artist, page_type, os.path.normpath(directory), time.time()),
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO images (artist, page_type, url, path) VALUES (?, ?, ?, ?)",
+                [(artist, page_type, url, path) for url, path in jobs],
+            )
+            self.conn.commit()
+
+    def pending(self, artist, page_type):
+        """
+        Return the (url, path) tuples of the page's images that haven't been saved yet, in the order they were added.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT url, path FROM images WHERE artist = ? AND page_type = ? AND done = 0 AND attempts < ? "
+                "ORDER BY rowid",
+                (artist, page_type, self.max_attempts),
+            ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def complete(self, artist, page_type, url):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE images SET done = 1 WHERE artist = ? AND page_type = ? AND url = ?", (artist, page_type, url)
+            )
+            self.conn.commit()
+
+    def fail(self, artist, page_type, url):
+        """
+        Count a failed attempt at downloading an image.
+
+        Returns:
+        - True if the image has failed too often and won't be retried.
+        """
+        with self.lock:
+            self.conn.execute(
+                "UPDATE images SET attempts = attempts + 1 WHERE artist = ? AND page_type = ? AND url = ?",
+                (artist, page_type, url),
+            )
+            self.conn.commit()
+            row = self.conn.execute(
+                "SELECT attempts FROM images WHERE artist = ? AND page_type = ? AND url = ?", (artist, page_type, url)
+            ).fetchone()
+        return row is not None and row[0] >= self.max_attempts
+
+    def remove_finished(self):
+        """
+        Forget the downloads that have no images left to retry, so the next images of those pages start a new directory.
+        """
+        with self.lock:
+            finished = self.conn.execute("""
+                SELECT artist, page_type FROM batches AS b WHERE NOT EXISTS (
+                    SELECT 1 FROM images AS i
+                    WHERE i.artist = b.artist AND i.page_type = b.page_type AND i.done = 0 AND i.attempts < ?
+                )
+            """, (self.max_attempts,)).fetchall()
+            for artist, page_type in finished:
+                self.conn.execute("DELETE FROM images WHERE artist = ? AND page_type = ?", (artist, page_type))
+                self.conn.execute("DELETE FROM batches WHERE artist = ? AND page_type = ?", (artist, page_type))
+            self.conn.commit()
+        if finished:
+            logging.info(f"Finished downloads of {len(finished)} page(s).")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
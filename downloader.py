@@ -0,0 +1,310 @@
+import os
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from content_hash import DropboxContentHasher
+from media_format import HEADER_SIZE, JPEG, sniff_extension
+from metrics import metrics
+from rate_limit import Throttled, rate_limits
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DownloadResult = namedtuple("DownloadResult", ["url", "path", "size", "content_hash"])
+
+# Suffix of the files that downloads are written to until they are complete
+PART_SUFFIX = ".part"
+
+
+class Throughput:
+    """
+    Download totals of a whole run: the images, bytes and failures of every download, whichever mode ran
+    it, and the time during which at least one download was in progress. Time spent scraping between
+    batches is left out, so the rates reflect the downloads only.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.images = 0
+        self.failures = 0
+        self.bytes = 0
+        self.busy_seconds = 0.0
+        self._active = 0
+        self._since = None
+
+    @contextmanager
+    def track(self):
+        """
+        Count one download while it runs. Call `add` with its size once it has succeeded; if it raises, it
+        is counted as a failure.
+        """
+        with self.lock:
+            if self._active == 0:
+                self._since = time.monotonic()
+            self._active += 1
+        try:
+            yield
+        except BaseException:
+            with self.lock:
+                self.failures += 1
+            raise
+        finally:
+            with self.lock:
+                self._active -= 1
+                if self._active == 0:
+                    self.busy_seconds += time.monotonic() - self._since
+
+    def add(self, size):
+        with self.lock:
+            self.images += 1
+            self.bytes += size
+
+    def log(self):
+        with self.lock:
+            if not self.images and not self.failures:
+                return
+            elapsed = max(self.busy_seconds, 1e-6)
+            logging.info(
+                f"Downloaded {self.images} images ({self.bytes} bytes, {self.failures} failed) in {elapsed:.2f}s of "
+                f"downloading: {self.bytes / elapsed:.0f} bytes/s, {self.images / elapsed:.2f} images/s."
+            )
+
+
+class PartialDownload:
+    """
+    One download into a `.part` file, independent of the HTTP client that fetches it.
+
+    Holds the resumption and hashing logic shared by the `ImageDownloader` and the async engine. For each
+    request, a client sends the headers returned by `resume`, restarts if `rejected` says the range was
+    refused, feeds the body to the function yielded by `writer`, and finally calls `finish`.
+    """
+
+    def __init__(self, url, path, chunk_size=256 * 1024):
+        self.url = url
+        self.path = path
+        self.part_path = f"{path}{PART_SUFFIX}"
+        self.chunk_size = chunk_size
+        self.hasher = DropboxContentHasher()
+        self.offset = 0
+        self.transferred = 0
+
+    def resume(self):
+        """
+        Feed an existing partial file to the hasher.
+
+        Returns:
+        - The request headers, with a Range header continuing the partial file if there is one.
+        """
+        self.hasher = DropboxContentHasher()
+        self.offset = 0
+        self.transferred = 0
+        if os.path.exists(self.part_path):
+            with open(self.part_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                    self.hasher.update(chunk)
+                    self.offset += len(chunk)
+        return {"Range": f"bytes={self.offset}-"} if self.offset else {}
+
+    def rejected(self, status):
+        """
+        Tell whether the server refused the range with a 416, in which case the partial file is no longer
+        a prefix of the resource. It is removed, and the request has to be sent again.
+        """
+        if self.offset and status == 416:
+            os.remove(self.part_path)
+            return True
+        return False
+
+    @contextmanager
+    def writer(self, status, headers):
+        """
+        Open the partial file for the body of a successful response, and yield a function writing and hashing a chunk.
+        """
+        content_range = headers.get("Content-Range", "")
+        if self.offset and (status != 206 or not content_range.startswith(f"bytes {self.offset}-")):
+            # The server ignored the range and sent the whole file
+            logging.info(f"Server did not resume {self.url} at byte {self.offset}. Downloading it again.")
+            self.hasher = DropboxContentHasher()
+            self.offset = 0
+        elif self.offset:
+            logging.info(f"Resuming {self.url} at byte {self.offset}.")
+
+        with open(self.part_path, 'ab' if self.offset else 'wb', buffering=self.chunk_size) as f:
+            def write(chunk):
+                f.write(chunk)
+                self.hasher.update(chunk)
+                self.transferred += len(chunk)
+            yield write
+
+    def _final_path(self):
+        """
+        Return the path with the extension of the format the downloaded file actually has.
+        """
+        with open(self.part_path, 'rb') as f:
+            extension = sniff_extension(f.read(HEADER_SIZE))
+        root, current = os.path.splitext(self.path)
+        if extension is None or extension == current.lower() or (extension == JPEG and current.lower() == ".jpeg"):
+            return self.path
+        return f"{root}{extension}"
+
+    def finish(self, fix_extensions=False):
+        """
+        Rename the complete partial file to its final path, correcting its extension with `fix_extensions`.
+
+        Returns:
+        - A DownloadResult with the final path and size of the file and its Dropbox content hash.
+        """
+        path = self._final_path() if fix_extensions else self.path
+        os.replace(self.part_path, path)
+        return DownloadResult(self.url, path, self.offset + self.transferred, self.hasher.hexdigest())
+
+
+class ImageDownloader:
+    """
+    Shared download engine used by both scraping functions.
+
+    All downloads go through a single keep-alive session, so connections to the image CDN are reused
+    across images and across artists. A bounded worker pool runs the downloads, and a semaphore per
+    host caps how many of them hit the same host at once. On top of that, the shared CDN rate limiter
+    paces the requests and adapts how many of them run in parallel; a 429 pauses all downloads for the
+    Retry-After time instead of having every worker retry on its own.
+    """
+
+    def __init__(self, max_workers=8, per_host=4, timeout=(5, 30), retries=3, backoff_factor=0.5,
+                 chunk_size=256 * 1024, limiter=None, fix_extensions=False):
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.chunk_size = chunk_size
+        self.limiter = limiter or rate_limits.get("cdn")
+        self.fix_extensions = fix_extensions
+        self.throughput = Throughput()
+
+        # 429s are left to the rate limiter, so they slow down every worker
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._host_slots = {}
+        self._host_slots_lock = threading.Lock()
+
+    def _host_slot(self, url):
+        host = urlparse(url).netloc
+        with self._host_slots_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_slots[host]
+
+    def _fetch(self, part, outcome):
+        """
+        Download a URL into its partial file, continuing an earlier partial download with a Range request.
+
+        Raises Throttled if the server answered with 429.
+        """
+        while True:
+            with self.session.get(part.url, stream=True, timeout=self.timeout, headers=part.resume()) as response:
+                outcome.response(response.status_code, response.headers.get("Retry-After"))
+                if outcome.throttled:
+                    raise Throttled(self.limiter.name, outcome.retry_after)
+                if part.rejected(response.status_code):
+                    # The connection goes back to the pool before the request is sent again
+                    continue
+                response.raise_for_status()
+
+                with part.writer(response.status_code, response.headers) as write:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        write(chunk)
+                return
+
+    def download(self, url, path, labels=None):
+        """
+        Download a single URL to the given path, hashing the content as it streams in.
+
+        The content is written to `<path>.part` and only renamed to `path` once it is complete, so an
+        interrupted download never leaves a truncated image behind. The next attempt resumes the partial
+        file with an HTTP Range request where the server supports it. With `fix_extensions`, the extension
+        of the final file is corrected to match its content, e.g. `image_1.webp` instead of `image_1.jpg`.
+
+        Args:
+        - url: The URL to download.
+        - path: The path the file is written to.
+        - labels: Optional metric labels, e.g. {"artist": ..., "page_type": ...}.
+
+        Returns:
+        - A DownloadResult with the final path and size of the file and its Dropbox content hash.
+        """
+        labels = labels or {}
+        part = PartialDownload(url, path, self.chunk_size)
+        with self.throughput.track():
+            for attempt in range(self.retries + 1):
+                try:
+                    with self._host_slot(url), self.limiter.slot() as outcome, metrics.timed("download", **labels):
+                        self._fetch(part, outcome)
+                        result = part.finish(self.fix_extensions)
+                    break
+                except Throttled:
+                    # The limiter holds the next attempt back until the CDN is ready again
+                    if attempt == self.retries:
+                        raise
+            self.throughput.add(result.size)
+        metrics.inc("download_bytes_total", part.transferred, **labels)
+        return result
+
+    def download_all(self, jobs, labels=None, on_complete=None):
+        """
+        Download a batch of images concurrently.
+
+        Args:
+        - jobs: An iterable of (url, path) tuples.
+        - labels: Optional metric labels, e.g. {"artist": ..., "page_type": ...}.
+        - on_complete: Optional callback called with each DownloadResult as soon as that image is saved.
+
+        Returns:
+        - The list of DownloadResults of the images that were downloaded successfully.
+        """
+        jobs = list(jobs)
+        if not jobs:
+            return []
+
+        downloaded = []
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as executor:
+            futures = {executor.submit(self.download, url, path, labels): (url, path) for url, path in jobs}
+            for future in as_completed(futures):
+                url, path = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The partial file is kept so the next attempt can resume it
+                    logging.error(f"Failed to download {url}: {e}")
+                    continue
+                downloaded.append(result)
+                logging.info(f"Downloaded {result.path}")
+                if on_complete is not None:
+                    on_complete(result)
+
+        # The throughput is logged once for the whole run, when the downloader is closed
+        logging.info(f"Downloaded {len(downloaded)}/{len(jobs)} images of the batch.")
+        return downloaded
+
+    def close(self):
+        self.throughput.log()
+        self.session.close()
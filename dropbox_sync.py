@@ -1,20 +1,171 @@
 import dropbox
 import os
+import json
 import logging
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import requests
 
+from content_hash import file_content_hash
+from discord_notifier import DiscordNotifier
+from downloader import PART_SUFFIX
+from metrics import metrics
+from rate_limit import rate_limits
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Dropbox accepts at most 1000 entries per upload session batch commit
+MAX_BATCH_ENTRIES = 1000
+
+
+def _correct_offset(error):
+    """
+    Return the offset Dropbox expects if an upload session call failed with an incorrect offset.
+    """
+    if hasattr(error, "is_incorrect_offset") and error.is_incorrect_offset():
+        return error.get_incorrect_offset().correct_offset
+    if hasattr(error, "is_lookup_failed") and error.is_lookup_failed():
+        return _correct_offset(error.get_lookup_failed())
+    return None
+
+
+def _rate_limit_backoff(error):
+    """
+    Return the seconds Dropbox asks to wait (0 if it didn't say) if an API call was rate limited, otherwise None.
+    """
+    if isinstance(error, dropbox.exceptions.RateLimitError):
+        return error.backoff or 0
+    return None
+
 
 class DropboxSyncBot:
-    def __init__(self, access_token, webhook_url):
-        self.dbx = dropbox.Dropbox(access_token)
+    def __init__(self, access_token, webhook_url, dbx=None, upload_workers=4, cursor_cache_path="dropbox_cursors.json",
+                 chunk_size=8 * 1024 * 1024, chunk_retries=3, notifier=None):
+        # A pre-built client (e.g. a local fake) can be passed in instead of an access token.
+        # Every API call is timed as dropbox_api_seconds{method=...}, and paced by the shared Dropbox rate
+        # limiter. The SDK's own retries on rate limiting are disabled, so a 429 slows down every worker.
+        if dbx is None:
+            dbx = dropbox.Dropbox(access_token, max_retries_on_rate_limit=0)
+        limited = rate_limits.get("dropbox").wrap(
+            dbx,
+            throttle_of=_rate_limit_backoff,
+            error_types=(requests.exceptions.RequestException, dropbox.exceptions.InternalServerError),
+        )
+        self.dbx = metrics.instrument(limited, "dropbox_api")
         self.webhook_url = webhook_url
+        # New directories are announced from a background queue, so the sync never waits for Discord
+        self.notifier = notifier if notifier is not None else DiscordNotifier(webhook_url)
+        self.upload_workers = upload_workers
+        self.cursor_cache_path = cursor_cache_path
+        self.chunk_size = chunk_size
+        self.chunk_retries = chunk_retries
+        # Directories already announced by sync_journal_entry, which may run on several threads
+        self._announced_directories = set()
+        self._announced_directories_lock = threading.Lock()
+
+    def _retry_chunk(self, f, cursor, call):
+        """
+        Send one chunk of an upload session, resuming from the offset Dropbox expects if a chunk fails.
+        """
+        for attempt in range(self.chunk_retries + 1):
+            f.seek(cursor.offset)
+            try:
+                return call()
+            except dropbox.exceptions.ApiError as e:
+                correct_offset = _correct_offset(e.error)
+                if correct_offset is None or attempt == self.chunk_retries:
+                    raise
+                cursor.offset = correct_offset
+                logging.warning(f"Upload session offset mismatch, resuming from offset {cursor.offset}.")
+            except (requests.exceptions.RequestException, dropbox.exceptions.InternalServerError) as e:
+                if attempt == self.chunk_retries:
+                    raise
+                logging.warning(f"Chunk upload at offset {cursor.offset} failed ({e}), retrying...")
+                time.sleep(2 ** attempt)
 
     def upload_file(self, file_path, destination_path):
+        """
+        Upload a file. Files larger than the chunk size are streamed through an upload session,
+        so they are never read into memory at once and can exceed the single-call size limit.
+        """
+        file_size = os.path.getsize(file_path)
+        metrics.inc("upload_bytes_total", file_size)
+        commit = dropbox.files.CommitInfo(path=destination_path, mode=dropbox.files.WriteMode("overwrite"))
+
+        with open(file_path, "rb") as f:
+            if file_size <= self.chunk_size:
+                self.dbx.files_upload(f.read(), destination_path, mode=commit.mode)
+                return
+
+            session_id = self.dbx.files_upload_session_start(f.read(self.chunk_size)).session_id
+            cursor = dropbox.files.UploadSessionCursor(session_id=session_id, offset=f.tell())
+
+            while file_size - cursor.offset > self.chunk_size:
+                self._retry_chunk(f, cursor, lambda: self.dbx.files_upload_session_append_v2(f.read(self.chunk_size), cursor))
+                cursor.offset = f.tell()
+
+            self._retry_chunk(f, cursor, lambda: self.dbx.files_upload_session_finish(f.read(self.chunk_size), cursor, commit))
+
+    def copy_file(self, source_path, destination_path):
+        """
+        Copy a file that is already on Dropbox to another Dropbox path without uploading it again.
+        """
+        try:
+            self.dbx.files_copy_v2(source_path, destination_path)
+        except dropbox.exceptions.ApiError as e:
+            if isinstance(e.error, dropbox.files.RelocationError) and e.error.is_to() and e.error.get_to().is_conflict():
+                return  # the destination already exists
+            raise
+
+    def _copy_or_upload(self, file_path, destination_path, copy_source):
+        """
+        Copy a duplicate from its existing Dropbox copy, falling back to a regular upload if that fails.
+        """
+        try:
+            self.copy_file(copy_source, destination_path)
+            logging.info(f"{file_path} is a duplicate of {copy_source}, copied it on Dropbox instead of uploading.")
+            return None
+        except dropbox.exceptions.ApiError as e:
+            logging.warning(f"Could not copy {copy_source} to {destination_path} ({e}), uploading instead.")
+        if os.path.getsize(file_path) <= self.chunk_size:
+            return self._start_batch_entry(file_path, destination_path)
+        return self.upload_file(file_path, destination_path)
+
+    def _start_batch_entry(self, file_path, destination_path):
+        """
+        Upload a small file into its own closed upload session, ready to be committed in a batch.
+        """
         with open(file_path, "rb") as f:
-            self.dbx.files_upload(f.read(), destination_path, mode=dropbox.files.WriteMode("overwrite"))
+            data = f.read()
+        metrics.inc("upload_bytes_total", len(data))
+        session_id = self.dbx.files_upload_session_start(data, close=True).session_id
+        return dropbox.files.UploadSessionFinishArg(
+            cursor=dropbox.files.UploadSessionCursor(session_id=session_id, offset=len(data)),
+            commit=dropbox.files.CommitInfo(path=destination_path, mode=dropbox.files.WriteMode("overwrite")),
+        )
+
+    def _finish_batch(self, entries):
+        """
+        Commit a batch of upload sessions in one call.
+
+        Returns:
+        - A list with None for each committed entry and the failure for each entry that failed.
+        """
+        if hasattr(self.dbx, "files_upload_session_finish_batch_v2"):
+            result = self.dbx.files_upload_session_finish_batch_v2(entries)
+        else:
+            job = self.dbx.files_upload_session_finish_batch(entries)
+            while True:
+                status = self.dbx.files_upload_session_finish_batch_check(job.get_async_job_id())
+                if status.is_complete():
+                    result = status.get_complete()
+                    break
+                if status.is_failed():
+                    raise RuntimeError(f"Upload session batch commit failed: {status.get_failed()}")
+                time.sleep(1)
+        return [None if entry.is_success() else entry.get_failure() for entry in result.entries]
 
     def directory_exists(self, path):
         try:
@@ -24,7 +175,7 @@ class DropboxSyncBot:
             if isinstance(e.error, dropbox.files.GetMetadataError) and \
                isinstance(e.error.get_path(), dropbox.files.LookupError):
                 return False
-        raise
+            raise
 
     def file_exists(self, path):
         try:
@@ -37,46 +188,154 @@ class DropboxSyncBot:
             raise
 
     def send_discord_embed(self, title, directory_name, url, artist, page_type):
-        data = {
-            "embeds": [{
-                "title": title,
-                "color": 3066993,  # You can change this color if you want
-                "fields": [
-                    {
-                        "name": "Artist",
-                        "value": artist,
-                        "inline": False
-                    },
-                    {
-                        "name": "Page Type",
-                        "value": page_type,
-                        "inline": False
-                    },
-                    {
-                        "name": "Directory Name",
-                        "value": directory_name,
-                        "inline": False
-                    },
-                    {
-                        "name": "Link",
-                        "value": f"[Open in Dropbox]({url})",
-                        "inline": False
-                    }
-                ]
-            }]
-        }
-        response = requests.post(self.webhook_url, json=data)
-        try:
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as err:
-            logging.error(err)
-        else:
-            logging.info("Payload delivered successfully, code {}.".format(response.status_code))
+        """
+        Queue the announcement of a new directory. Directories of the same artist and page type are merged into one embed.
+        """
+        self.notifier.send_directory(title, artist, page_type, directory_name, url)
+
+    def _load_cursor_cache(self):
+        if self.cursor_cache_path and os.path.exists(self.cursor_cache_path):
+            with open(self.cursor_cache_path, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def _save_cursor_cache(self, cache):
+        if not self.cursor_cache_path:
+            return
+        temp_path = f"{self.cursor_cache_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(cache, f)
+        os.replace(temp_path, self.cursor_cache_path)
+
+    @staticmethod
+    def _apply_entries(entries, remote):
+        for entry in entries:
+            if isinstance(entry, dropbox.files.DeletedMetadata):
+                remote.pop(entry.path_lower, None)
+            elif isinstance(entry, dropbox.files.FileMetadata):
+                remote[entry.path_lower] = {"type": "file", "size": entry.size, "content_hash": entry.content_hash}
+            elif isinstance(entry, dropbox.files.FolderMetadata):
+                remote[entry.path_lower] = {"type": "folder"}
+
+    def list_remote(self, dropbox_folder):
+        """
+        List everything below a Dropbox folder.
+
+        The first listing of a folder is a recursive `files_list_folder`. The result is cached on disk
+        together with the listing cursor, so later calls only fetch the changes since the previous call.
+
+        Returns:
+        - A dict mapping lower-cased Dropbox paths to {"type", "size", "content_hash"} dicts.
+        """
+        cache = self._load_cursor_cache()
+        cached = cache.get(dropbox_folder.lower())
+        remote = {}
+        result = None
+
+        if cached:
+            remote = cached["entries"]
+            try:
+                result = self.dbx.files_list_folder_continue(cached["cursor"])
+            except dropbox.exceptions.ApiError as e:
+                logging.info(f"Cached listing cursor for {dropbox_folder} is no longer valid ({e}). Listing again.")
+                remote = {}
+                result = None
+
+        if result is None:
+            try:
+                result = self.dbx.files_list_folder(dropbox_folder, recursive=True)
+            except dropbox.exceptions.ApiError as e:
+                if isinstance(e.error, dropbox.files.ListFolderError) and e.error.is_path() and \
+                   e.error.get_path().is_not_found():
+                    return {}
+                raise
+
+        self._apply_entries(result.entries, remote)
+        while result.has_more:
+            result = self.dbx.files_list_folder_continue(result.cursor)
+            self._apply_entries(result.entries, remote)
+
+        cache[dropbox_folder.lower()] = {"cursor": result.cursor, "entries": remote}
+        self._save_cursor_cache(cache)
+        logging.info(f"Listed {len(remote)} entries in {dropbox_folder}.")
+        return remote
+
+    def upload_files(self, uploads, copy_sources=None):
+        """
+        Upload files concurrently.
+
+        Large files are streamed through their own upload sessions. Small files are uploaded into closed
+        sessions in parallel and then committed together with `files_upload_session_finish_batch`.
+        Files with the same content as a file already on Dropbox are copied server-side instead.
+
+        Args:
+        - uploads: A list of (local_path, dropbox_path) tuples.
+        - copy_sources: An optional dict mapping local paths to the Dropbox path of an identical file.
+
+        Returns:
+        - A list of (local_path, exception) tuples for the uploads that failed.
+        """
+        failed = []
+        if not uploads:
+            return failed
+
+        batch_entries = []
+        with ThreadPoolExecutor(max_workers=min(self.upload_workers, len(uploads))) as executor:
+            futures = {}
+            for local_path, dropbox_path in uploads:
+                copy_source = (copy_sources or {}).get(local_path)
+                if copy_source is not None:
+                    futures[executor.submit(self._copy_or_upload, local_path, dropbox_path, copy_source)] = (local_path, dropbox_path)
+                elif os.path.getsize(local_path) <= self.chunk_size:
+                    futures[executor.submit(self._start_batch_entry, local_path, dropbox_path)] = (local_path, dropbox_path)
+                else:
+                    futures[executor.submit(self.upload_file, local_path, dropbox_path)] = (local_path, dropbox_path)
+
+            for future in as_completed(futures):
+                local_path, dropbox_path = futures[future]
+                try:
+                    batch_entry = future.result()
+                except Exception as e:
+                    logging.error(f"Failed to upload {local_path} to {dropbox_path}: {e}")
+                    failed.append((local_path, e))
+                    continue
+                if batch_entry is not None:
+                    batch_entries.append((local_path, dropbox_path, batch_entry))
+                else:
+                    logging.info(f"Uploaded {local_path} to {dropbox_path}")
+
+        for start in range(0, len(batch_entries), MAX_BATCH_ENTRIES):
+            batch = batch_entries[start:start + MAX_BATCH_ENTRIES]
+            try:
+                results = self._finish_batch([entry for _, _, entry in batch])
+            except Exception as e:
+                logging.error(f"Failed to commit a batch of {len(batch)} uploads: {e}")
+                failed.extend((local_path, e) for local_path, _, _ in batch)
+                continue
+            for (local_path, dropbox_path, _), error in zip(batch, results):
+                if error is None:
+                    logging.info(f"Uploaded {local_path} to {dropbox_path}")
+                else:
+                    logging.error(f"Failed to upload {local_path} to {dropbox_path}: {error}")
+                    failed.append((local_path, error))
+        return failed
 
     def sync_folder(self, local_folder, dropbox_folder):
+        local_folder = os.path.normpath(local_folder)
+
+        # Fetch the remote state once and diff it against the local tree in memory
+        remote = self.list_remote(dropbox_folder)
+        remote_by_hash = {
+            metadata["content_hash"]: path for path, metadata in remote.items()
+            if metadata["type"] == "file" and metadata.get("content_hash")
+        }
+        uploads = []
+        copy_sources = {}
+        new_directories = []
+
         for root, dirs, files in os.walk(local_folder):
 
-            for dir in dirs.copy():  # We use .copy() to iterate over a copy of the list, so removing items won't cause issues
+            for dir in dirs:
                 local_dir_path = os.path.join(root, dir)
                 relative_dir_path = os.path.relpath(local_dir_path, local_folder)
                 dropbox_dir_path = os.path.join(dropbox_folder, relative_dir_path)
@@ -84,25 +343,133 @@ class DropboxSyncBot:
                 # Check if the directory is two levels down from the root (i.e., it's inside "feed" or "artist")
                 is_two_levels_down = os.path.dirname(os.path.dirname(local_dir_path)) == local_folder
 
-                if self.directory_exists(dropbox_dir_path) and is_two_levels_down:
-                    logging.info(f"Skipping existing directory: {dropbox_dir_path}")
-                    dirs.remove(dir)  # remove from dirs list to prevent further os.walk into this directory
-                elif not self.directory_exists(dropbox_dir_path):
-                    base_url = "https://www.dropbox.com/home"
-                    full_link = f"{base_url}{dropbox_dir_path}"
-                    # Extracting artist and page type
-                    _, _, artist, page_type, _ = dropbox_dir_path.split('/')
-                    directory_name = os.path.basename(dropbox_dir_path)  # extract the last part of the path
-                    self.send_discord_embed("New Directory Synced to Dropbox", directory_name, full_link, artist, page_type)
+                if is_two_levels_down and dropbox_dir_path.lower() not in remote:
+                    new_directories.append(dropbox_dir_path)
 
             for file in files:
                 if file == ".DS_Store":
                     continue  # skip .DS_Store files
+                if file.endswith(PART_SUFFIX):
+                    continue  # skip downloads that haven't finished yet
 
                 local_path = os.path.join(root, file)
                 relative_path = os.path.relpath(local_path, local_folder)
                 dropbox_path = os.path.join(dropbox_folder, relative_path)
-                if not self.file_exists(dropbox_path):
+                if dropbox_path.lower() not in remote:
                     logging.info(f"Attempting to upload: {local_path} to {dropbox_path}")
-                    self.upload_file(local_path, dropbox_path)
-                    logging.info(f"Uploaded {local_path} to {dropbox_path}")
+                    uploads.append((local_path, dropbox_path))
+
+                    # Files whose content is already on Dropbox are copied there instead of uploaded
+                    if remote_by_hash:
+                        copy_source = remote_by_hash.get(file_content_hash(local_path))
+                        if copy_source is not None:
+                            copy_sources[local_path] = copy_source
+
+        failed = self.upload_files(uploads, copy_sources)
+
+        for dropbox_dir_path in new_directories:
+            self.notify_new_directory(dropbox_dir_path)
+
+        if failed:
+            raise RuntimeError(f"{len(failed)} of {len(uploads)} uploads failed, first error: {failed[0][1]}")
+
+    def notify_new_directory(self, dropbox_dir_path):
+        base_url = "https://www.dropbox.com/home"
+        full_link = f"{base_url}{dropbox_dir_path}"
+        # Extracting artist and page type
+        _, _, artist, page_type, _ = dropbox_dir_path.split('/')
+        directory_name = os.path.basename(dropbox_dir_path)  # extract the last part of the path
+        self.send_discord_embed("New Directory Synced to Dropbox", directory_name, full_link, artist, page_type)
+
+    def sync_journal(self, journal, local_root, dropbox_root):
+        """
+        Upload only the files recorded as pending in a SyncJournal and mark them as synced.
+
+        Args:
+        - journal: The SyncJournal the scraper recorded its downloads in.
+        - local_root: The local directory the journal paths are relative to (e.g. "downloaded_images").
+        - dropbox_root: The Dropbox directory mirroring `local_root` (e.g. "/weverse").
+        """
+        entries = journal.pending()
+        if not entries:
+            logging.info("No pending files to sync.")
+            return
+
+        local_root = os.path.normpath(local_root)
+        uploads = []
+        copy_sources = {}
+        entries_by_path = {}
+        missing_ids = []
+        for entry in entries:
+            if not os.path.exists(entry.path):
+                # Files deleted locally can never be synced, so they are dropped from the pending entries
+                logging.warning(f"Skipping missing file from the sync journal: {entry.path}")
+                missing_ids.append(entry.id)
+                continue
+            dropbox_path = os.path.join(dropbox_root, os.path.relpath(entry.path, local_root))
+            uploads.append((entry.path, dropbox_path))
+            entries_by_path[entry.path] = entry
+
+            # Files with the same content as an already synced file are copied on Dropbox instead of uploaded
+            synced_duplicate = journal.synced_path_for_hash(entry.content_hash) if entry.content_hash else None
+            if synced_duplicate is not None and synced_duplicate != entry.path:
+                copy_sources[entry.path] = os.path.join(dropbox_root, os.path.relpath(synced_duplicate, local_root))
+
+        # Directories without any previously synced file are new on Dropbox
+        new_directory_candidates = {
+            os.path.dirname(local_path) for local_path, _ in uploads
+            if not journal.directory_synced(os.path.dirname(local_path))
+        }
+
+        logging.info(f"Syncing {len(uploads)} pending files to Dropbox ({len(copy_sources)} duplicates)...")
+        failed = self.upload_files(uploads, copy_sources)
+        failed_paths = {local_path for local_path, _ in failed}
+        journal.mark_synced(missing_ids + [entry.id for path, entry in entries_by_path.items() if path not in failed_paths])
+
+        new_directories = {
+            os.path.dirname(dropbox_path) for local_path, dropbox_path in uploads
+            if local_path not in failed_paths and os.path.dirname(local_path) in new_directory_candidates
+        }
+
+        for dropbox_dir_path in sorted(new_directories):
+            self.notify_new_directory(dropbox_dir_path)
+
+        if failed:
+            raise RuntimeError(f"{len(failed)} of {len(uploads)} uploads failed, first error: {failed[0][1]}")
+
+    def sync_journal_entry(self, journal, entry_id, local_path, local_root, dropbox_root, content_hash=None):
+        """
+        Upload a single journaled file as soon as it has been downloaded and mark it as synced.
+        The first file synced into a new directory triggers the Discord notification for that directory.
+        """
+        local_root = os.path.normpath(local_root)
+        local_path = os.path.normpath(local_path)
+        dropbox_path = os.path.join(dropbox_root, os.path.relpath(local_path, local_root))
+        local_directory = os.path.dirname(local_path)
+
+        synced_duplicate = journal.synced_path_for_hash(content_hash) if content_hash else None
+        if synced_duplicate is not None and synced_duplicate != local_path:
+            copy_source = os.path.join(dropbox_root, os.path.relpath(synced_duplicate, local_root))
+            batch_entry = self._copy_or_upload(local_path, dropbox_path, copy_source)
+            if batch_entry is not None:
+                error = self._finish_batch([batch_entry])[0]
+                if error is not None:
+                    raise RuntimeError(f"Failed to upload {local_path} to {dropbox_path}: {error}")
+        else:
+            self.upload_file(local_path, dropbox_path)
+            logging.info(f"Uploaded {local_path} to {dropbox_path}")
+
+        with self._announced_directories_lock:
+            is_new_directory = local_directory not in self._announced_directories and \
+                not journal.directory_synced(local_directory)
+            self._announced_directories.add(local_directory)
+            journal.mark_synced([entry_id])
+
+        if is_new_directory:
+            self.notify_new_directory(os.path.dirname(dropbox_path))
+
+    def close(self):
+        """
+        Deliver the queued Discord notifications.
+        """
+        self.notifier.close()
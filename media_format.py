@@ -0,0 +1,91 @@
+import struct
+
+# Extensions of the formats that can be told apart by their first bytes
+JPEG = ".jpg"
+PNG = ".png"
+GIF = ".gif"
+WEBP = ".webp"
+AVIF = ".avif"
+MP4 = ".mp4"
+MOV = ".mov"
+
+# Number of bytes `sniff_extension` needs
+HEADER_SIZE = 32
+
+
+def sniff_extension(header):
+    """
+    Return the file extension matching the magic bytes at the start of a file, or None if the format is unknown.
+    """
+    if header.startswith(b"\xff\xd8\xff"):
+        return JPEG
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return PNG
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return GIF
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return WEBP
+    if header[4:8] == b"ftyp":
+        brand = header[8:12]
+        if brand in (b"avif", b"avis"):
+            return AVIF
+        return MOV if brand == b"qt  " else MP4
+    return None
+
+
+def _jpeg_size(f):
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        # Padding bytes between markers
+        while marker[1] == 0xFF:
+            marker = marker[:1] + f.read(1)
+        if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+            continue
+        length = f.read(2)
+        if len(length) < 2:
+            return None
+        # Start of frame markers, except DHT, JPG and DAC, hold the dimensions
+        if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+            frame = f.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack(">HH", frame[1:5])
+            return width, height
+        f.seek(struct.unpack(">H", length)[0] - 2, 1)
+
+
+def _webp_size(header):
+    chunk = header[12:16]
+    if chunk == b"VP8 " and len(header) >= 30:
+        width, height = struct.unpack("<HH", header[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and len(header) >= 25:
+        bits = int.from_bytes(header[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X" and len(header) >= 30:
+        return int.from_bytes(header[24:27], "little") + 1, int.from_bytes(header[27:30], "little") + 1
+    return None
+
+
+def image_size(path):
+    """
+    Read the width and height of a JPEG, PNG, GIF or WebP image from its header, without decoding it.
+
+    Returns:
+    - A (width, height) tuple, or None for other formats and damaged headers.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+        extension = sniff_extension(header)
+        if extension == PNG and len(header) >= 24:
+            return struct.unpack(">II", header[16:24])
+        if extension == GIF and len(header) >= 10:
+            return struct.unpack("<HH", header[6:10])
+        if extension == WEBP:
+            return _webp_size(header)
+        if extension == JPEG:
+            return _jpeg_size(f)
+    return None
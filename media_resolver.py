@@ -0,0 +1,101 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+from weverse_api import WeverseApiClient
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class MediaResolver:
+    """
+    Resolves posts into the full list of their media: every photo in its original resolution and every video.
+
+    The feed and artist pages only show one preview image per post. The resolver fetches each discovered
+    post from the Weverse API, with at most `workers` requests in flight, and caches the result by post ID
+    in a SQLite database. A post is therefore resolved once, no matter on how many pages or in how many
+    runs it shows up.
+    """
+
+    def __init__(self, client, path="media_cache.db", workers=4):
+        self.client = client
+        self.path = path
+        self.workers = workers
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS posts (
+                post_id TEXT PRIMARY KEY,
+                media TEXT NOT NULL,
+                resolved_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def cached(self, post_ids):
+        """
+        Return a dict mapping the already resolved post IDs among `post_ids` to their media URLs.
+        """
+        post_ids = list(post_ids)
+        cached = {}
+        with self.lock:
+            # Stay below SQLite's limit on the number of query parameters
+            for start in range(0, len(post_ids), 500):
+                batch = post_ids[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT post_id, media FROM posts WHERE post_id IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                cached.update((post_id, json.loads(media)) for post_id, media in rows)
+        return cached
+
+    def _resolve(self, post_id):
+        post = self.client.post(post_id)
+        media = WeverseApiClient.post_image_urls(post)
+        for video_id in WeverseApiClient.post_video_ids(post):
+            video_url = self.client.video_url(video_id)
+            if video_url:
+                media.append(video_url)
+        return media
+
+    def resolve_many(self, post_ids):
+        """
+        Resolve posts into their media URLs, fetching only the posts that aren't cached yet.
+
+        Returns:
+        - A dict mapping post IDs to lists of media URLs. Posts that couldn't be resolved are left out.
+        """
+        post_ids = list(dict.fromkeys(post_ids))
+        resolved = self.cached(post_ids)
+        missing = [post_id for post_id in post_ids if post_id not in resolved]
+        metrics.inc("media_cache_hits_total", len(resolved))
+        if not missing:
+            return resolved
+
+        started = time.monotonic()
+        fetched = []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(missing))) as executor:
+            futures = {executor.submit(self._resolve, post_id): post_id for post_id in missing}
+            for future, post_id in futures.items():
+                try:
+                    media = future.result()
+                except Exception as e:
+                    logging.error(f"Failed to resolve the media of post {post_id}: {e}")
+                    metrics.inc("media_resolve_errors_total")
+                    continue
+                resolved[post_id] = media
+                fetched.append((post_id, json.dumps(media), time.time()))
+
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO posts (post_id, media, resolved_at) VALUES (?, ?, ?)", fetched)
+            self.conn.commit()
+        logging.info(f"Resolved the media of {len(fetched)}/{len(missing)} post(s) in {time.monotonic() - started:.2f}s.")
+        return resolved
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
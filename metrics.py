@@ -0,0 +1,210 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Histogram buckets in seconds, from a single WebDriver call up to a full page scroll
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "buckets": {str(bound): count for bound, count in zip(self.buckets, self.counts)},
+        }
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+class _InstrumentedClient:
+    """
+    Proxy timing every method call of the wrapped client.
+    """
+
+    def __init__(self, metrics, client, name, labels):
+        self._metrics = metrics
+        self._client = client
+        self._name = name
+        self._labels = labels
+
+    def __getattr__(self, attr):
+        value = getattr(self._client, attr)
+        if not callable(value):
+            return value
+
+        def timed_call(*args, **kwargs):
+            with self._metrics.timed(self._name, method=attr, **self._labels):
+                return value(*args, **kwargs)
+        return timed_call
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters, gauges and duration histograms, labelled e.g. by artist and page type.
+
+    Durations are recorded with the `timed` context manager, which also counts failures. The registry
+    can be written as a JSON report or in the Prometheus text format, either to a textfile for the node
+    exporter or through a small HTTP endpoint.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.started_at = time.time()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.gauges[key] = value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key(labels))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(seconds)
+
+    @contextmanager
+    def timed(self, name, **labels):
+        """
+        Record the duration of the block as `<name>_seconds`, and count failures as `<name>_errors_total`.
+        """
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException:
+            self.inc(f"{name}_errors_total", **labels)
+            raise
+        finally:
+            self.observe(f"{name}_seconds", time.monotonic() - started, **labels)
+
+    def instrument(self, client, name, **labels):
+        """
+        Wrap a client so each of its method calls is timed as `<name>_seconds{method=...}`.
+        """
+        return _InstrumentedClient(self, client, name, labels)
+
+    def report(self):
+        with self.lock:
+            return {
+                "started_at": self.started_at,
+                "duration_seconds": round(time.time() - self.started_at, 3),
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "gauges": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.gauges.items())
+                ],
+                "histograms": [
+                    dict({"name": name, "labels": dict(labels)}, **histogram.as_dict())
+                    for (name, labels), histogram in sorted(self.histograms.items())
+                ],
+            }
+
+    def write_json(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        logging.info(f"Saved metrics report as: {path}")
+
+    def prometheus_text(self):
+        lines = []
+        with self.lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE weverse_scraper_{name} counter")
+                for (counter_name, labels), value in sorted(self.counters.items()):
+                    if counter_name == name:
+                        lines.append(f"weverse_scraper_{name}{_format_labels(labels)} {value}")
+
+            for name in sorted({name for name, _ in self.gauges}):
+                lines.append(f"# TYPE weverse_scraper_{name} gauge")
+                for (gauge_name, labels), value in sorted(self.gauges.items()):
+                    if gauge_name == name:
+                        lines.append(f"weverse_scraper_{name}{_format_labels(labels)} {value}")
+
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE weverse_scraper_{name} histogram")
+                for (histogram_name, labels), histogram in sorted(self.histograms.items()):
+                    if histogram_name != name:
+                        continue
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f"weverse_scraper_{name}_bucket{_format_labels(labels, [('le', str(bound))])} {count}")
+                    lines.append(f"weverse_scraper_{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram.count}")
+                    lines.append(f"weverse_scraper_{name}_sum{_format_labels(labels)} {histogram.sum}")
+                    lines.append(f"weverse_scraper_{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        # The node exporter may read the file at any time, so it is replaced atomically
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+    def serve(self, port):
+        """
+        Expose the metrics in the Prometheus text format on http://0.0.0.0:<port>/metrics from a background thread.
+        """
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logging.info(f"Serving Prometheus metrics on port {port}.")
+        return server
+
+
+# Shared registry for the whole process
+metrics = Metrics()
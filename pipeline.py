@@ -0,0 +1,145 @@
+import logging
+import queue
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class StageMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.max_queue_depth = 0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                "processed": self.processed,
+                "failed": self.failed,
+                "busy_seconds": round(self.busy_seconds, 3),
+                "avg_queue_wait_seconds": round(self.wait_seconds / self.processed, 3) if self.processed else 0.0,
+                "max_queue_depth": self.max_queue_depth,
+                "avg_latency_seconds": round(self.total_latency / self.processed, 3) if self.processed else 0.0,
+                "max_latency_seconds": round(self.max_latency, 3),
+            }
+
+
+class Stage:
+    """
+    One step of a Pipeline: a bounded input queue drained by a fixed number of worker threads.
+
+    The handler is called with each item and returns the item to pass on to the next stage, or None to
+    drop it. Putting into a full queue blocks, which slows down the previous stage (backpressure).
+    """
+
+    def __init__(self, name, handler, workers=1, queue_size=100):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.metrics = StageMetrics()
+        self.next_stage = None
+        self._threads = []
+
+    def put(self, item, submitted_at):
+        self.queue.put((item, submitted_at, time.monotonic()))
+        with self.metrics.lock:
+            self.metrics.max_queue_depth = max(self.metrics.max_queue_depth, self.queue.qsize())
+
+    def _run(self):
+        while True:
+            entry = self.queue.get()
+            if entry is _DONE:
+                return
+            item, submitted_at, queued_at = entry
+
+            started = time.monotonic()
+            try:
+                output = self.handler(item)
+                failed = False
+            except Exception as e:
+                logging.error(f"Pipeline stage {self.name} failed on {item}: {e}")
+                output = None
+                failed = True
+            finished = time.monotonic()
+
+            with self.metrics.lock:
+                self.metrics.processed += 1
+                self.metrics.failed += failed
+                self.metrics.busy_seconds += finished - started
+                self.metrics.wait_seconds += started - queued_at
+                self.metrics.total_latency += finished - submitted_at
+                self.metrics.max_latency = max(self.metrics.max_latency, finished - submitted_at)
+
+            if output is not None and self.next_stage is not None:
+                self.next_stage.put(output, submitted_at)
+
+    def start(self):
+        self._threads = [
+            threading.Thread(target=self._run, name=f"{self.name}-{index}", daemon=True)
+            for index in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        for _ in self._threads:
+            self.queue.put(_DONE)
+        for thread in self._threads:
+            thread.join()
+
+
+class Pipeline:
+    """
+    Producer/consumer pipeline of stages connected by bounded queues.
+
+    Items submitted to the pipeline flow through the stages in order while the producer keeps working,
+    so e.g. the browser keeps scrolling while earlier images download and upload. `close` waits for all
+    submitted items to drain and returns the per-stage metrics; each stage's latency is measured from
+    the time an item was submitted to the pipeline.
+    """
+
+    def __init__(self):
+        self.stages = []
+
+    def add_stage(self, name, handler, workers=1, queue_size=100):
+        stage = Stage(name, handler, workers=workers, queue_size=queue_size)
+        if self.stages:
+            self.stages[-1].next_stage = stage
+        self.stages.append(stage)
+        return stage
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def submit(self, item):
+        """
+        Submit an item to the first stage, blocking while its queue is full.
+        """
+        self.stages[0].put(item, time.monotonic())
+
+    def close(self):
+        """
+        Wait for all submitted items to pass through every stage and stop the workers.
+
+        Returns:
+        - A dict mapping stage names to their metrics.
+        """
+        # Stages are stopped in order, so every item produced by a stage is queued before the next one stops
+        for stage in self.stages:
+            stage.stop()
+
+        metrics = {stage.name: stage.metrics.as_dict() for stage in self.stages}
+        for name, stage_metrics in metrics.items():
+            logging.info(f"Pipeline stage {name}: {stage_metrics}")
+        return metrics
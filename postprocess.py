@@ -0,0 +1,164 @@
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from media_format import image_size, sniff_extension, HEADER_SIZE
+from metrics import metrics
+
+try:
+    from PIL import Image
+except ImportError:
+    # Thumbnails and perceptual hashes need Pillow, the rest of the post-processing doesn't
+    Image = None
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+MANIFEST_NAME = "manifest.jsonl"
+THUMBNAIL_DIR = "thumbnails"
+
+
+def _difference_hash(image):
+    """
+    Return the 64-bit difference hash of an image as 16 hex digits. Similar images have hashes that differ in few bits.
+    """
+    pixels = list(image.convert("L").resize((9, 8)).getdata())
+    bits = 0
+    for row in range(8):
+        for column in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + column] > pixels[row * 9 + column + 1])
+    return f"{bits:016x}"
+
+
+def process_image(path, thumbnail_size):
+    """
+    Read the format and dimensions of a downloaded file, and make its thumbnail and perceptual hash.
+
+    Runs in a worker process, so only takes and returns plain values.
+
+    Returns:
+    - A dict with the format, width, height, perceptual hash and thumbnail path of the file. Values that
+      don't apply, e.g. the dimensions of a video, or need Pillow when it isn't installed, are None.
+    """
+    started = time.monotonic()
+    with open(path, 'rb') as f:
+        extension = sniff_extension(f.read(HEADER_SIZE))
+    size = image_size(path)
+    info = {
+        "format": extension.lstrip('.') if extension else None,
+        "width": size[0] if size else None,
+        "height": size[1] if size else None,
+        "phash": None,
+        "thumbnail": None,
+    }
+
+    if Image is not None and extension not in (None, ".mp4", ".mov"):
+        try:
+            with Image.open(path) as image:
+                info["width"], info["height"] = image.size
+                info["phash"] = _difference_hash(image)
+                image.thumbnail((thumbnail_size, thumbnail_size))
+                directory, file_name = os.path.split(path)
+                thumbnail_path = os.path.join(directory, THUMBNAIL_DIR, f"{os.path.splitext(file_name)[0]}.jpg")
+                os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+                image.convert("RGB").save(thumbnail_path, "JPEG", quality=85)
+                info["thumbnail"] = os.path.relpath(thumbnail_path, directory)
+        except OSError:
+            # Formats Pillow can't decode, like AVIF without its plugin, are still listed with what is known
+            pass
+
+    info["seconds"] = time.monotonic() - started
+    return info
+
+
+class PostProcessor:
+    """
+    Post-download stage describing every saved image in a manifest next to it.
+
+    The decoding work (dimensions, thumbnails, perceptual hashes) runs in a pool of `workers` processes,
+    so it uses every core without holding up the downloads. As each image is done, a line with its URL,
+    post, artist, size, format, dimensions, content hash, perceptual hash and thumbnail is appended to
+    `manifest.jsonl` in the image's directory, so consumers never need to decode the images themselves.
+    Thumbnails and perceptual hashes are skipped if Pillow isn't installed. With a SyncJournal, the manifest
+    and thumbnails are recorded as pending like the images, so they are synced to Dropbox with them.
+    """
+
+    def __init__(self, workers=None, thumbnail_size=320, journal=None):
+        self.thumbnail_size = thumbnail_size
+        self.journal = journal
+        # Processes are spawned rather than forked, as the parent runs browser, download and upload threads
+        self.executor = ProcessPoolExecutor(max_workers=workers or None, mp_context=multiprocessing.get_context("spawn"))
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.idle = threading.Condition()
+        if Image is None:
+            logging.warning("Pillow is not installed. Thumbnails and perceptual hashes are skipped.")
+
+    def submit(self, result, artist, page_type, post_id=None):
+        """
+        Queue a downloaded file for post-processing.
+
+        Args:
+        - result: The DownloadResult of the file.
+        - artist: The artist the file belongs to.
+        - page_type: The page type the file was found on.
+        - post_id: The ID of the post the file belongs to, if known.
+        """
+        entry = {
+            "file": os.path.basename(result.path),
+            "url": result.url,
+            "post_id": post_id,
+            "artist": artist,
+            "page_type": page_type,
+            "size": result.size,
+            "content_hash": result.content_hash,
+        }
+        with self.idle:
+            self.pending += 1
+        future = self.executor.submit(process_image, result.path, self.thumbnail_size)
+        future.add_done_callback(lambda future: self._write_entry(result.path, entry, future))
+
+    def _write_entry(self, path, entry, future):
+        try:
+            self._write_outputs(path, entry, future)
+        finally:
+            with self.idle:
+                self.pending -= 1
+                self.idle.notify_all()
+
+    def _write_outputs(self, path, entry, future):
+        labels = {"artist": entry["artist"], "page_type": entry["page_type"]}
+        try:
+            info = future.result()
+        except Exception as e:
+            logging.error(f"Failed to post-process {path}: {e}")
+            metrics.inc("postprocess_errors_total", **labels)
+            info = {}
+        if "seconds" in info:
+            metrics.observe("postprocess_seconds", info.pop("seconds"), **labels)
+
+        entry.update(info)
+        directory = os.path.dirname(path)
+        manifest_path = os.path.join(directory, MANIFEST_NAME)
+        with self.lock:
+            with open(manifest_path, 'a') as f:
+                f.write(json.dumps(entry) + "\n")
+            if self.journal is not None:
+                # Recording the manifest again marks it as pending again, so the synced copy gets the new line
+                outputs = [manifest_path] + ([os.path.join(directory, entry["thumbnail"])] if entry.get("thumbnail") else [])
+                for output in outputs:
+                    self.journal.record(output, os.path.getsize(output), None, entry["artist"], entry["page_type"])
+
+    def drain(self):
+        """
+        Wait until every queued file has its manifest entry and thumbnail, e.g. before syncing the directories.
+        """
+        with self.idle:
+            self.idle.wait_for(lambda: self.pending == 0)
+
+    def close(self):
+        # Waits for the queued files, so every manifest is complete
+        self.executor.shutdown(wait=True)
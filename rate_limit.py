@@ -0,0 +1,338 @@
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+
+from metrics import metrics
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Destinations of outbound traffic, and their default requests per second and maximum concurrency
+DEFAULT_LIMITS = {
+    "cdn": {"rate": 20, "max_concurrency": 8},
+    "weverse_api": {"rate": 5, "max_concurrency": 4},
+    "dropbox": {"rate": 10, "max_concurrency": 4},
+    # Discord allows 5 requests per 2 seconds per webhook
+    "discord": {"rate": 2, "burst": 5, "max_concurrency": 1},
+}
+
+
+class Throttled(Exception):
+    """
+    Raised when a destination answered with 429 Too Many Requests.
+    """
+
+    def __init__(self, destination, retry_after=None):
+        super().__init__(f"Throttled by {destination}" + (f", retry after {retry_after:.1f}s" if retry_after else ""))
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header, given either in seconds or as an HTTP date, into seconds.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class Outcome:
+    """
+    The result of one request made through `RateLimiter.slot`, reported back by the caller.
+    """
+
+    def __init__(self):
+        self.status = None
+        self.throttled = False
+        self.retry_after = None
+        self.error = False
+
+    def response(self, status, retry_after=None):
+        """
+        Report the HTTP status of the response, and its Retry-After header if it has one.
+        """
+        self.status = status
+        if status == 429 or (status == 503 and retry_after):
+            self.throttle(parse_retry_after(retry_after))
+        elif status >= 500:
+            self.error = True
+
+    def throttle(self, retry_after=None):
+        self.throttled = True
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """
+    Token bucket and adaptive concurrency limit for the requests to one destination.
+
+    Requests are started at no more than `rate` per second, with bursts of up to `burst`. The number
+    of requests in flight adapts AIMD-style between `min_concurrency` and `max_concurrency`: it grows by
+    one per round of healthy responses, stays put while latency is more than `latency_factor` times the
+    best latency seen, and is cut by `backoff` on throttling and server errors. A 429 also pauses the
+    whole destination for its Retry-After time, instead of each thread retrying on its own.
+    """
+
+    def __init__(self, name, rate=None, burst=None, max_concurrency=8, min_concurrency=1, backoff=0.5,
+                 latency_factor=2.0, throttle_delay=1.0):
+        self.name = name
+        self.rate = rate
+        self.burst = burst or max(1, int(rate or 1))
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.backoff = backoff
+        self.latency_factor = latency_factor
+        self.throttle_delay = throttle_delay
+
+        self.limit = float(max(min_concurrency, max_concurrency // 2))
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+        self.tokens = float(self.burst)
+        self.refilled_at = time.monotonic()
+        self.paused_until = 0.0
+        self.bucket_lock = threading.Lock()
+
+        self.average_latency = None
+        self.best_latency = None
+        self.decreased_at = 0.0
+        metrics.set("rate_limit_concurrency", self.limit, destination=name)
+
+    def _try_acquire_slot(self):
+        with self.condition:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def _acquire_slot(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def _release_slot(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def _take_token(self):
+        """
+        Take a token if one is available. Returns 0 if one was taken, otherwise the seconds until the next one.
+        """
+        with self.bucket_lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            if not self.rate:
+                return 0
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+            self.refilled_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def _acquire_token(self):
+        while delay := self._take_token():
+            time.sleep(delay)
+
+    def _start(self, queued_at):
+        started = time.monotonic()
+        metrics.observe("rate_limit_wait_seconds", started - queued_at, destination=self.name)
+        metrics.inc("rate_limit_requests_total", destination=self.name)
+        return started
+
+    @staticmethod
+    def _failed(outcome, error):
+        if isinstance(error, Throttled):
+            outcome.throttle(error.retry_after)
+        elif isinstance(error, asyncio.CancelledError):
+            # A cancelled request says nothing about the destination
+            outcome.status = outcome.status or 0
+        elif outcome.status is None and not outcome.throttled:
+            outcome.error = True
+
+    def _record(self, started, latency, outcome):
+        with self.condition:
+            if outcome.throttled or outcome.error:
+                # The requests already in flight when the limit was cut don't cut it again
+                if started >= self.decreased_at:
+                    self.limit = max(self.min_concurrency, self.limit * self.backoff)
+                    self.decreased_at = time.monotonic()
+            else:
+                self.average_latency = latency if self.average_latency is None else 0.8 * self.average_latency + 0.2 * latency
+                self.best_latency = min(self.best_latency or self.average_latency, self.average_latency)
+                if self.average_latency <= self.latency_factor * self.best_latency:
+                    # Adds one slot per `limit` healthy responses, i.e. one per round
+                    self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+            limit = self.limit
+        metrics.set("rate_limit_concurrency", limit, destination=self.name)
+
+        if outcome.throttled:
+            delay = outcome.retry_after if outcome.retry_after is not None else self.throttle_delay
+            with self.bucket_lock:
+                self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            metrics.inc("rate_limit_throttled_total", destination=self.name)
+            logging.warning(f"Throttled by {self.name}. Pausing for {delay:.1f}s, concurrency limit is now {int(limit)}.")
+        elif outcome.error:
+            metrics.inc("rate_limit_errors_total", destination=self.name)
+
+    @contextmanager
+    def slot(self):
+        """
+        Wait for a concurrency slot and a token, then run the block as one request.
+
+        Yields an Outcome that the block reports the response to. A block that raises before reporting a
+        response counts as an error.
+        """
+        queued_at = time.monotonic()
+        self._acquire_slot()
+        try:
+            self._acquire_token()
+        except BaseException:
+            self._release_slot()
+            raise
+        started = self._start(queued_at)
+
+        outcome = Outcome()
+        try:
+            yield outcome
+        except BaseException as e:
+            self._failed(outcome, e)
+            raise
+        finally:
+            self._release_slot()
+            self._record(started, time.monotonic() - started, outcome)
+
+    @asynccontextmanager
+    async def async_slot(self):
+        """
+        Like `slot`, for coroutines: waiting for a concurrency slot or a token doesn't block the event loop.
+        """
+        queued_at = time.monotonic()
+        while not self._try_acquire_slot():
+            await asyncio.sleep(0.01)
+        try:
+            while delay := self._take_token():
+                await asyncio.sleep(delay)
+        except BaseException:
+            self._release_slot()
+            raise
+        started = self._start(queued_at)
+
+        outcome = Outcome()
+        try:
+            yield outcome
+        except BaseException as e:
+            self._failed(outcome, e)
+            raise
+        finally:
+            self._release_slot()
+            self._record(started, time.monotonic() - started, outcome)
+
+    def request(self, send, *args, retries=3, **kwargs):
+        """
+        Send a `requests`-style request, retrying it after the destination's pause while it is throttled.
+
+        Returns:
+        - The last response.
+        """
+        for attempt in range(retries + 1):
+            with self.slot() as outcome:
+                response = send(*args, **kwargs)
+                outcome.response(response.status_code, response.headers.get("Retry-After"))
+            if not outcome.throttled or attempt == retries:
+                return response
+            response.close()
+
+    def wrap(self, client, throttle_of=None, error_types=(), retries=3):
+        """
+        Wrap a client so each of its method calls goes through this limiter.
+
+        Args:
+        - client: The client to wrap.
+        - throttle_of: Optional function returning the retry delay in seconds (or 0 if unknown) if an exception
+          raised by the client means the destination is throttling, and None otherwise.
+        - error_types: Exception types that mean the destination is struggling, e.g. server and connection
+          errors. Other exceptions, like "not found", are answers and don't reduce the concurrency.
+        - retries: How many times a throttled call is retried.
+        """
+        return _RateLimitedClient(self, client, throttle_of, error_types, retries)
+
+
+class _RateLimitedClient:
+    """
+    Proxy sending every method call of the wrapped client through a RateLimiter.
+    """
+
+    def __init__(self, limiter, client, throttle_of, error_types, retries):
+        self._limiter = limiter
+        self._client = client
+        self._throttle_of = throttle_of
+        self._error_types = error_types
+        self._retries = retries
+
+    def __getattr__(self, attr):
+        value = getattr(self._client, attr)
+        if not callable(value):
+            return value
+
+        def limited_call(*args, **kwargs):
+            for attempt in range(self._retries + 1):
+                with self._limiter.slot() as outcome:
+                    try:
+                        return value(*args, **kwargs)
+                    except Exception as e:
+                        retry_after = self._throttle_of(e) if self._throttle_of is not None else None
+                        if retry_after is not None:
+                            outcome.throttle(retry_after or None)
+                            if attempt == self._retries:
+                                raise
+                        elif isinstance(e, self._error_types):
+                            outcome.error = True
+                            raise
+                        else:
+                            outcome.status = getattr(e, "status_code", None) or 400
+                            raise
+        return limited_call
+
+
+class RateLimits:
+    """
+    Process-wide registry of one RateLimiter per destination.
+    """
+
+    def __init__(self, defaults=DEFAULT_LIMITS):
+        self.defaults = defaults
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def configure(self, name, **settings):
+        """
+        Replace the limiter of a destination, e.g. with the rate and concurrency from the configuration.
+        """
+        settings = dict(self.defaults.get(name, {}), **{key: value for key, value in settings.items() if value is not None})
+        with self.lock:
+            self.limiters[name] = RateLimiter(name, **settings)
+            return self.limiters[name]
+
+    def get(self, name):
+        with self.lock:
+            if name not in self.limiters:
+                self.limiters[name] = RateLimiter(name, **self.defaults.get(name, {}))
+            return self.limiters[name]
+
+
+# Shared registry for the whole process
+rate_limits = RateLimits()
@@ -0,0 +1,79 @@
+import heapq
+import logging
+import random
+import statistics
+import time
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class AdaptiveSchedule:
+    """
+    Polling schedule with one adaptive interval per (artist, page_type) job.
+
+    Each job's first interval is estimated from the times its saved images were added, i.e. how often
+    the artist actually posts. After every poll the interval tightens when new images were found and
+    backs off when the page was quiet, always staying between `min_interval` and `max_interval`.
+    """
+
+    def __init__(self, min_interval=5 * 60, max_interval=6 * 3600, default_interval=30 * 60,
+                 speedup=0.5, backoff=1.5, jitter=0.1):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.default_interval = default_interval
+        self.speedup = speedup
+        self.backoff = backoff
+        self.jitter = jitter
+        self.intervals = {}
+        self._queue = []
+
+    def _clamp(self, interval):
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def estimate_interval(self, added_times):
+        """
+        Estimate a polling interval from the times images of a job were saved.
+
+        Images saved within a few minutes of each other belong to the same post or run, so the gaps
+        between those groups approximate how often new content appears. Polling at half the typical
+        gap catches most posts early without polling quiet artists constantly.
+        """
+        events = []
+        for added_at in sorted(added_times):
+            if not events or added_at - events[-1] > 10 * 60:
+                events.append(added_at)
+        if len(events) < 2:
+            return self.default_interval
+
+        gaps = [later - earlier for earlier, later in zip(events, events[1:])]
+        return self._clamp(statistics.median(gaps) / 2)
+
+    def add(self, key, added_times=(), first_run_at=None):
+        """
+        Add a job to the schedule, due immediately unless `first_run_at` is given.
+        """
+        self.intervals[key] = self.estimate_interval(added_times)
+        logging.info(f"Polling {key} every {self.intervals[key] / 60:.0f} minutes based on its history.")
+        heapq.heappush(self._queue, (first_run_at or time.time(), key))
+
+    def pop_next(self):
+        """
+        Remove and return the job that is due next as (due_time, key).
+        """
+        return heapq.heappop(self._queue)
+
+    def record(self, key, new_images):
+        """
+        Adapt a job's interval after a poll and schedule its next poll.
+
+        Args:
+        - key: The job that was polled.
+        - new_images: The number of new images the poll found.
+        """
+        factor = self.speedup if new_images else self.backoff
+        self.intervals[key] = self._clamp(self.intervals[key] * factor)
+
+        # Jitter keeps jobs with the same interval from always running back to back
+        delay = self.intervals[key] * random.uniform(1 - self.jitter, 1 + self.jitter)
+        heapq.heappush(self._queue, (time.time() + delay, key))
+        logging.info(f"Next poll of {key} in {delay / 60:.1f} minutes.")
@@ -1,9 +1,14 @@
 import os
+import sys
+import signal
+import asyncio
 import logging
 import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-
-import requests
+from functools import partial
+from urllib.parse import urlparse
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -11,110 +16,411 @@ from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, ElementClickInterceptedException, TimeoutException
-import undetected_chromedriver as uc
-from dotenv import load_dotenv
-
-from dropbox_sync import DropboxSyncBot
 
-load_dotenv()
+from async_core import AsyncEngine
+from context import new_execution_timestamp
+from downloader import PART_SUFFIX
+from media_resolver import MediaResolver
+from scroll_engine import ScrollEngine
+from stop_condition import StopCondition
+from weverse_api import WeverseApiClient
+from worker_pool import BrowserWorkerPool, export_session, import_session
+from pipeline import Pipeline
+from scheduler import AdaptiveSchedule
+from metrics import metrics
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-EMAIL = os.getenv("EMAIL")
-PASSWORD = os.getenv("PASSWORD")
+# Extensions of the video files that media resolution can return
+VIDEO_EXTENSIONS = (".mp4", ".mov")
 
-DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL")
+def clean_url(url):
+    """
+    Clean the URL to remove the type parameter.
+    """
+    base_url = url.split('?')[0]
+    return base_url
 
-ENABLE_DROPBOX_SYNC = os.getenv("ENABLE_DROPBOX_SYNC", "True").lower() == "true"
+def media_extension(url):
+    """
+    Return the file extension to save a media URL with: the video's own extension, or ".jpg" for images.
+    """
+    extension = os.path.splitext(urlparse(url).path)[1].lower()
+    return extension if extension in VIDEO_EXTENSIONS else ".jpg"
 
-if ENABLE_DROPBOX_SYNC:
-    logging.info("Dropbox sync is ENABLED.")
-    DROPBOX_TOKEN = os.getenv("DROPBOX_TOKEN")
-    bot = DropboxSyncBot(DROPBOX_TOKEN, DISCORD_WEBHOOK_URL)
-else:
-    logging.info("Dropbox sync is DISABLED.")
+def note_media_posts(ctx, media_posts, page_type):
+    """
+    With post-processing enabled, note the posts of media URLs in `ctx.media_posts` for the manifest.
+    URLs that are already saved won't be downloaded, so they are left out and the dict doesn't keep growing.
+    """
+    if ctx.config.postprocess_images:
+        saved_urls = ctx.url_store.filter_seen(media_posts, page_type)
+        ctx.media_posts.update((url, post_id) for url, post_id in media_posts.items() if url not in saved_urls)
 
-MAX_FEED_URLS = int(os.getenv("MAX_FEED_URLS", 1000))
-MAX_ARTIST_URLS = int(os.getenv("MAX_ARTIST_URLS", 1000))
+def expand_media(ctx, preview_urls, post_ids, page_type):
+    """
+    Replace post preview images with the full-resolution media of their posts when media resolution is enabled.
 
-# Create a unique directory for this execution to store screenshots and downloads
-EXECUTION_TIMESTAMP = datetime.now().strftime("%Y%m%d_%H%M%S/")
-SCREENSHOT_DIR = os.path.join("screenshots", EXECUTION_TIMESTAMP)
+    Args:
+    - ctx: The ScraperContext of the run.
+    - preview_urls: The src of the preview images found on the page.
+    - post_ids: A dict mapping preview image srcs to the IDs of their posts.
+    - page_type: The page type the previews were found on.
 
-ARTISTS = [artist.strip() for artist in os.getenv("ARTISTS").split(',')]
-SKIP_FEED_ARTISTS = set(artist.strip() for artist in os.getenv('SKIP_FEED_ARTISTS', '').split(','))
-SKIP_ARTIST_PAGE_ARTISTS = set(artist.strip() for artist in os.getenv('SKIP_ARTIST_PAGE_ARTISTS', '').split(','))
+    Returns:
+    - The set of media URLs. Previews whose post is unknown or couldn't be resolved are kept as they are, and
+      so are previews saved before media resolution was enabled, so scrolling still stops at them. The post
+      of every media URL is noted with `note_media_posts`.
+    """
+    if ctx.media_resolver is None:
+        note_media_posts(ctx, {clean_url(url): post_ids[url] for url in preview_urls if url in post_ids}, page_type)
+        return {clean_url(url) for url in preview_urls}
+
+    saved_previews = ctx.url_store.filter_seen({clean_url(url) for url in preview_urls}, page_type)
+    unresolved_urls = [url for url in preview_urls if url in post_ids and clean_url(url) not in saved_previews]
+    with metrics.timed("media_resolution"):
+        resolved = ctx.media_resolver.resolve_many(post_ids[url] for url in unresolved_urls)
+    media_urls = set()
+    media_posts = {}
+    for url in preview_urls:
+        media = resolved.get(post_ids.get(url)) if clean_url(url) not in saved_previews else None
+        if media:
+            media_urls.update(media)
+        else:
+            media = [clean_url(url)]
+            media_urls.update(media)
+        if url in post_ids:
+            media_posts.update((media_url, post_ids[url]) for media_url in media)
+    note_media_posts(ctx, media_posts, page_type)
+    return media_urls
 
-def save_urls_to_file(urls, page_type, filename=None):
-    if filename is None:
-        filename = f"{page_type}_saved_urls.txt"
-    with open(filename, 'w') as f:
-        for url in urls:
-            f.write(url + '\n')
+DownloadJob = namedtuple("DownloadJob", ["url", "path", "artist", "page_type"])
 
-def load_urls_from_file(page_type, filename=None):
-    if filename is None:
-        filename = f"{page_type}_saved_urls.txt"
-    if os.path.exists(filename):
-        with open(filename, 'r') as f:
-            return set(line.strip() for line in f)
-    return set()
+def next_image_path(ctx, directory_name, extension=".jpg"):
+    """
+    Return the path of the next image_N file in a directory, numbering images across pipeline submissions.
+    """
+    with ctx.image_indexes_lock:
+        ctx.image_indexes[directory_name] = ctx.image_indexes.get(directory_name, 0) + 1
+        return os.path.join(directory_name, f"image_{ctx.image_indexes[directory_name]}{extension}")
 
-def send_discord_alert(title, description):
+def download_jobs(ctx, new_image_urls, artist_name, page_type):
     """
-    Send an alert message to a Discord channel via webhook in the form of an embed.
+    Assign file paths to new images and record them in the download checkpoint before they are downloaded.
 
-    Args:
-    - title: The title of the embed.
-    - description: The description/content of the embed.
-    """
-    payload = {
-        'embeds': [{
-            'title': title,
-            'description': description,
-            'color': 16711680  # Red color for error
-        }]
-    }
-    response = requests.post(DISCORD_WEBHOOK_URL, json=payload)
-    if response.status_code == 204:
-        logging.info(f"Sent alert to Discord: {title} - {description}")
-    else:
-        logging.error(f"Failed to send alert to Discord. Status code: {response.status_code}, Response: {response.text}")
+    New images always go into this run's (or daemon poll's) directory. The first time a page is processed in a
+    run or poll, the unfinished images of earlier runs are returned as well, to be downloaded into their own
+    directory under the names they were recorded with.
 
-def clean_url(url):
+    Returns:
+    - The directory of the new images and a list of (url, path) tuples to download.
     """
-    Clean the URL to remove the type parameter.
+    checkpoint = ctx.checkpoint
+    directory_name = ctx.directory_for(artist_name, page_type)
+    recorded_count = 0
+    recorded_urls = set()
+    resumed_jobs = []
+    checkpoint_directory = checkpoint.directory(artist_name, page_type)
+    if checkpoint_directory is not None:
+        # Only the new URLs are looked up, as the checkpoint of a long backfill can hold a lot of images
+        recorded_urls = checkpoint.recorded(artist_name, page_type, new_image_urls)
+        if checkpoint_directory == os.path.normpath(directory_name):
+            recorded_count = checkpoint.count(artist_name, page_type)
+        if (artist_name, page_type) not in ctx.resumed_pages:
+            resumed_jobs = checkpoint.pending(artist_name, page_type)
+            if resumed_jobs:
+                logging.info(f"Resuming {len(resumed_jobs)} unfinished download(s) of {artist_name}'s {page_type} page.")
+                for resumed_directory in {os.path.dirname(path) for _, path in resumed_jobs}:
+                    os.makedirs(resumed_directory, exist_ok=True)
+    ctx.resumed_pages.add((artist_name, page_type))
+
+    # Continue the numbering of the images already recorded in the directory
+    with ctx.image_indexes_lock:
+        ctx.image_indexes[directory_name] = max(ctx.image_indexes.get(directory_name, 0), recorded_count)
+    new_jobs = [
+        (img_url, next_image_path(ctx, directory_name, media_extension(img_url)))
+        for img_url in new_image_urls if img_url not in recorded_urls
+    ]
+    if new_jobs:
+        checkpoint.add(artist_name, page_type, directory_name, new_jobs)
+    return directory_name, claim_downloads(ctx, resumed_jobs + new_jobs)
+
+def claim_downloads(ctx, jobs):
     """
-    base_url = url.split('?')[0]
-    return base_url
+    Mark images as being downloaded, leaving out those that an earlier pipeline or async submission is still downloading.
+
+    Every claimed image has to be released with `release_downloads` once its download has finished or failed.
+
+    Returns:
+    - The (url, path) tuples that were claimed.
+    """
+    with ctx.downloads_in_flight_lock:
+        claimed = [(img_url, path) for img_url, path in jobs if img_url not in ctx.downloads_in_flight]
+        ctx.downloads_in_flight.update(img_url for img_url, _ in claimed)
+    return claimed
+
+def release_downloads(ctx, img_urls):
+    with ctx.downloads_in_flight_lock:
+        ctx.downloads_in_flight.difference_update(img_urls)
+
+def record_download(ctx, result, artist_name, page_type):
+    """
+    Record a downloaded image as saved and pending for sync, and check it off in the download checkpoint.
+    With post-processing enabled, the image is also queued for its manifest entry and thumbnail.
+
+    Returns:
+    - The ID of the image's sync journal entry.
+    """
+    ctx.content_store.deduplicate(result.path, result.size, result.content_hash)
+    entry_id = ctx.sync_journal.record(result.path, result.size, result.content_hash, artist_name, page_type)
+    ctx.url_store.add([result.url], page_type, artist_name)
+    ctx.checkpoint.complete(artist_name, page_type, result.url)
+    post_id = ctx.media_posts.pop(result.url, None)
+    if ctx.config.postprocess_images:
+        ctx.postprocessor.submit(result, artist_name, page_type, post_id)
+    return entry_id
+
+def record_failure(ctx, img_url, path, artist_name, page_type):
+    # The partial file is kept for the next attempt, unless the image has failed too often
+    if ctx.checkpoint.fail(artist_name, page_type, img_url):
+        logging.warning(f"Giving up on {img_url} after repeated failures.")
+        ctx.media_posts.pop(img_url, None)
+        if os.path.exists(f"{path}{PART_SUFFIX}"):
+            os.remove(f"{path}{PART_SUFFIX}")
+
+def submit_new_images(ctx, new_image_urls, artist_name, page_type):
+    """
+    Queue new images for the download and upload stages of the pipeline as soon as they are discovered.
+    """
+    directory_name, jobs = download_jobs(ctx, new_image_urls, artist_name, page_type)
+    if not jobs:
+        return
+    os.makedirs(directory_name, exist_ok=True)
+    for img_url, path in jobs:
+        ctx.pipeline.submit(DownloadJob(img_url, path, artist_name, page_type))
+
+def download_stage(ctx, job):
+    """
+    Pipeline stage downloading one image and recording it as saved and pending for sync.
+    """
+    try:
+        result = ctx.downloader.download(job.url, job.path, labels={"artist": job.artist, "page_type": job.page_type})
+        logging.info(f"Downloaded {result.path}")
+        entry_id = record_download(ctx, result, job.artist, job.page_type)
+    except Exception:
+        record_failure(ctx, job.url, job.path, job.artist, job.page_type)
+        raise
+    finally:
+        release_downloads(ctx, [job.url])
+    if not ctx.config.enable_dropbox_sync:
+        return None
+    return entry_id, result.path, result.content_hash
+
+def upload_stage(ctx, item):
+    """
+    Pipeline stage uploading one downloaded image to Dropbox.
+    """
+    entry_id, local_path, content_hash = item
+    ctx.bot.sync_journal_entry(ctx.sync_journal, entry_id, local_path, ctx.config.download_dir, ctx.config.dropbox_root,
+                               content_hash=content_hash)
+
+def create_pipeline(ctx):
+    """
+    Create and start the pipeline downloading, and uploading if Dropbox sync is enabled, images while scraping.
+    """
+    pipeline = Pipeline()
+    pipeline.add_stage("download", partial(download_stage, ctx), workers=ctx.config.download_workers,
+                       queue_size=ctx.config.pipeline_queue_size)
+    if ctx.config.enable_dropbox_sync:
+        pipeline.add_stage("upload", partial(upload_stage, ctx), workers=ctx.config.dropbox_upload_workers,
+                           queue_size=ctx.config.pipeline_queue_size)
+    pipeline.start()
+    return pipeline
+
+async def save_image_async(ctx, img_url, path, artist_name, page_type):
+    """
+    Download one image on the async engine, record it as saved and upload it to Dropbox if sync is enabled.
+
+    Failures are logged and recorded rather than raised, so one image can't cancel the rest of its page.
+    """
+    try:
+        result = await ctx.async_engine.http.download(img_url, path, labels={"artist": artist_name, "page_type": page_type})
+        logging.info(f"Downloaded {result.path}")
+        # The stores are SQLite databases, so they are written from a thread instead of the event loop
+        entry_id = await asyncio.to_thread(record_download, ctx, result, artist_name, page_type)
+    except Exception as e:
+        # The partial file is kept so the next attempt can resume it
+        logging.error(f"Failed to save {img_url}: {e!r}")
+        try:
+            await asyncio.to_thread(record_failure, ctx, img_url, path, artist_name, page_type)
+        except Exception as e:
+            logging.error(f"Failed to record the failure of {img_url}: {e!r}")
+        return None
+    if ctx.async_engine.dropbox is not None:
+        try:
+            await ctx.async_engine.dropbox.sync_journal_entry(
+                ctx.sync_journal, entry_id, result.path, ctx.config.download_dir, ctx.config.dropbox_root,
+                content_hash=result.content_hash,
+            )
+        except Exception as e:
+            # The file stays pending in the sync journal and is picked up by the next sync
+            logging.error(f"Failed to upload {result.path}: {e!r}")
+    return result
+
+async def save_page_async(ctx, jobs, artist_name, page_type):
+    """
+    Download and upload the images of a page concurrently, giving up on the page after `ASYNC_PAGE_TIMEOUT` seconds.
+
+    Returns:
+    - The list of URLs that were downloaded successfully.
+    """
+    tasks = []
+    try:
+        async with asyncio.timeout(ctx.config.async_page_timeout or None):
+            async with asyncio.TaskGroup() as group:
+                tasks = [
+                    group.create_task(save_image_async(ctx, img_url, path, artist_name, page_type))
+                    for img_url, path in jobs
+                ]
+    except TimeoutError:
+        # The unfinished images stay in the download checkpoint and are resumed by the next run
+        logging.error(f"Timed out saving the images of {artist_name}'s {page_type} page after {ctx.config.async_page_timeout}s.")
+        metrics.inc("async_page_timeouts_total", artist=artist_name, page_type=page_type)
+    finally:
+        # Also covers the images whose task was cancelled before it started
+        release_downloads(ctx, [img_url for img_url, _ in jobs])
+    return [task.result().url for task in tasks if task.done() and not task.cancelled() and task.result()]
+
+def create_async_engine(ctx):
+    """
+    Create the async engine downloading, and uploading if Dropbox sync is enabled, the images of many pages at once.
+    """
+    config = ctx.config
+    return AsyncEngine(
+        ctx.downloader,
+        bot=ctx.bot if config.enable_dropbox_sync else None,
+        max_pending=config.pipeline_queue_size,
+        upload_workers=config.dropbox_upload_workers,
+        upload_timeout=config.async_upload_timeout or None,
+    )
+
+def save_new_images(ctx, new_image_urls, artist_name, page_type):
+    """
+    Download new images into this execution's directory and record them as saved.
+
+    Every image is recorded as soon as it has been saved, and the download checkpoint lets a restarted
+    run finish an interrupted download in the same directory.
 
-def trim_saved_urls(filename, max_urls=1000):
+    Args:
+    - ctx: The ScraperContext of the run.
+    - new_image_urls: The list of image URLs that haven't been saved yet.
+    - artist_name: The artist the images belong to.
+    - page_type: The page type ("feed" or "artist") the images were found on.
+
+    Returns:
+    - The list of URLs that were downloaded successfully, or queued for download in pipeline and async mode.
     """
-    Trim the saved URLs file to keep only the most recent URLs.
+    # In pipeline mode the images are downloaded and recorded by the pipeline stages
+    if ctx.pipeline is not None:
+        submit_new_images(ctx, new_image_urls, artist_name, page_type)
+        return new_image_urls
+
+    directory_name, jobs = download_jobs(ctx, new_image_urls, artist_name, page_type)
+
+    # In async mode the page is handed to the event loop, and the next page is scraped meanwhile
+    if ctx.async_engine is not None:
+        if jobs:
+            os.makedirs(directory_name, exist_ok=True)
+            ctx.async_engine.submit(save_page_async(ctx, jobs, artist_name, page_type), weight=len(jobs))
+        return new_image_urls
+    downloaded_urls = []
+    if jobs:
+        os.makedirs(directory_name, exist_ok=True)
+
+        def on_complete(result):
+            record_download(ctx, result, artist_name, page_type)
+            downloaded_urls.append(result.url)
+
+        try:
+            ctx.downloader.download_all(jobs, labels={"artist": artist_name, "page_type": page_type}, on_complete=on_complete)
+            saved_urls = set(downloaded_urls)
+            for img_url, path in jobs:
+                if img_url not in saved_urls:
+                    record_failure(ctx, img_url, path, artist_name, page_type)
+        finally:
+            release_downloads(ctx, [img_url for img_url, _ in jobs])
+        ctx.checkpoint.remove_finished()
+
+        # Trim the saved URLs to keep only the most recent ones. A backfill keeps every URL, as the
+        # index is what tells it which images it has already saved.
+        if not ctx.config.backfill_mode:
+            ctx.url_store.trim(page_type, max_urls=ctx.config.max_urls(page_type))
+
+    return downloaded_urls
+
+def page_media(ctx, posts, skip=lambda post: False):
+    """
+    Return the media URLs of the posts of an API page, resolving the whole page in one batch.
 
     Args:
-    - filename: The file containing the saved URLs.
-    - max_urls: The maximum number of URLs to retain. Older URLs beyond this number will be removed.
+    - ctx: The ScraperContext of the run.
+    - posts: The posts of the page, as returned by the API.
+    - skip: Tells which posts with an ID don't need to be resolved. Their images are taken from the post.
+
+    Returns:
+    - A list of (post, media URLs) pairs in page order, without the pinned posts.
+    """
+    # Pinned posts are shown first regardless of their age, so they are left out like when scrolling
+    posts = [post for post in posts if not post.get("pinned")]
+    resolved = {}
+    if ctx.media_resolver is not None:
+        # Adds the posts' videos, and reuses the cached media of posts resolved before
+        with metrics.timed("media_resolution"):
+            resolved = ctx.media_resolver.resolve_many(
+                post["postId"] for post in posts if post.get("postId") and not skip(post)
+            )
+    return [
+        (post, resolved.get(post.get("postId")) or [clean_url(url) for url in WeverseApiClient.post_image_urls(post)])
+        for post in posts
+    ]
+
+def scrape_images_from_api(ctx, artist_name, page_type, max_pages=50):
     """
-    if os.path.exists(filename):
-        with open(filename, 'r') as f:
-            urls = f.readlines()
+    Collect new images by paging through the Weverse API instead of scrolling the page.
+    Paging stops like scrolling does, once `STOP_AFTER_KNOWN_POSTS` posts in a row are older than the
+    page's high-water mark or already saved.
 
-        # Check if the number of URLs exceeds the maximum allowed
-        if len(urls) > max_urls:
-            # Split URLs into those to retain and those to remove
-            removed_urls = urls[:-max_urls]
-            trimmed_urls = urls[-max_urls:]
+    Args:
+    - ctx: The ScraperContext of the run, with an API client.
+    - artist_name: The artist's URL path.
+    - page_type: "feed" or "artist".
+    - max_pages: The maximum number of API pages to request.
 
-            # Log the number of removed URLs and the actual URLs
-            logging.info(f"Removing {len(removed_urls)} URLs:")
-            for url in removed_urls:
-                logging.info(url.strip())
+    Returns:
+    - The list of new image URLs, newest first.
+    """
+    new_image_urls = []
+    stop = StopCondition(ctx.post_marks.get(artist_name, page_type), known_posts=ctx.config.stop_after_known_posts)
+    for posts in ctx.api_client.iter_pages(artist_name, page_type, max_pages=max_pages):
+        # Posts older than the mark aren't downloaded, so they aren't resolved
+        for post, post_img_links in page_media(ctx, posts, skip=lambda post: stop.older(post["postId"], post.get("publishedAt"))):
+            matching_saved_images = ctx.url_store.filter_seen(post_img_links, page_type)
+            if stop.observe(post.get("postId"), post.get("publishedAt"), saved=bool(matching_saved_images)):
+                logging.info(f"Found {stop.consecutive} known posts in a row, down to post {post.get('postId')}. Stopping.")
+                break
+            # Posts older than the mark were seen last run, so even if their URLs were trimmed they aren't new
+            if stop.older(post.get("postId"), post.get("publishedAt")):
+                continue
 
-            # Write the trimmed URLs back to the file
-            with open(filename, 'w') as f:
-                f.writelines(trimmed_urls)
-            logging.info(f"Trimmed saved URLs to the last {max_urls} entries.")
+            new_image_urls.extend(url for url in post_img_links if url not in new_image_urls and url not in matching_saved_images)
+            if ctx.config.postprocess_images and post.get("postId"):
+                ctx.media_posts.update((url, post["postId"]) for url in post_img_links if url not in matching_saved_images)
+        if stop.stopped:
+            break
+
+    if stop.newest is not None:
+        ctx.post_marks.advance(artist_name, page_type, stop.newest)
+    return new_image_urls
 
 def get_h1_text(driver):
     """
@@ -168,13 +474,13 @@ def click_submit_button(driver):
         logging.warning(f"Submit button click intercepted or not found: {e}")
         return False
 
-def screenshot(driver, name, directory=SCREENSHOT_DIR):
+def screenshot(driver, name, directory):
     """
     Save a screenshot of the current state of the driver.
 
     Args:
     - driver: The Selenium WebDriver instance.
-    - directory: The directory where the screenshot will be saved. Defaults to "./screenshots/".
+    - directory: The directory where the screenshot will be saved, usually the run's `ctx.screenshot_dir`.
 
     Returns:
     - The path to the saved screenshot.
@@ -183,30 +489,51 @@ def screenshot(driver, name, directory=SCREENSHOT_DIR):
     if not os.path.exists(directory):
         os.makedirs(directory)
         logging.info(f"Created directory: {directory}")
-    
+
     # Generate a timestamped filename
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    screenshot_name = f"{directory}{name}_{timestamp}.png"
-    
+    screenshot_name = os.path.join(directory, f"{name}_{timestamp}.png")
+
     # Save the screenshot
     driver.save_screenshot(screenshot_name)
     logging.info(f"Saved screenshot as: {screenshot_name}")
-    
+
     return screenshot_name
 
-def scrape_images(driver, artist_name, max_scroll_times=50, scroll_delay=2):
-    scroll_count = 0
-    all_images = set()
+def open_page(ctx, driver, artist, page_type):
+    """
+    Navigate to an artist's feed or artist page and take a screenshot once it has loaded.
 
-    # Load existing URLs
-    existing_urls = {clean_url(url) for url in load_urls_from_file("feed")}
+    Args:
+    - ctx: The ScraperContext of the run.
+    - driver: The Selenium WebDriver instance.
+    - artist: The artist's URL path.
+    - page_type: "feed" or "artist".
+    """
+    page_url = f"https://weverse.io/{artist}/{page_type}"
+    logging.info(f"Navigating to {page_url}")
+    with metrics.timed("navigation", artist=artist, page_type=page_type):
+        driver.get(page_url)
+
+    time.sleep(5)
+    page_name = "feed" if page_type == "feed" else "artist_page"
+    logging.info(f"Taking a screenshot for artist {artist}'s {page_name.replace('_', ' ')} after navigation")
+    screenshot(driver, f"{artist}_{page_name}_after_login", ctx.screenshot_dir)
 
-    # Check the first three posts for pinned posts
+def find_pinned_images(driver, artist_name, page_type="feed"):
+    """
+    Return the images of the pinned posts at the top of an artist's page, which are shown regardless of their age.
+    """
+    # Check the first posts for pinned posts
     pinned_img_links = []
     time.sleep(2)  # Wait for a short duration to ensure that dynamic content is loaded
-    first_three_posts = driver.find_elements(By.CSS_SELECTOR, ".PostListItemView_post_item__XJ0uc")[:10]
-    for post in first_three_posts:
-        date_element = post.find_element(By.CSS_SELECTOR, ".PostHeaderView_date__XJXBZ")
+    with metrics.timed("find_elements", artist=artist_name, page_type=page_type):
+        first_posts = driver.find_elements(By.CSS_SELECTOR, ".PostListItemView_post_item__XJ0uc")[:10]
+    for post in first_posts:
+        try:
+            date_element = post.find_element(By.CSS_SELECTOR, ".PostHeaderView_date__XJXBZ")
+        except NoSuchElementException:
+            continue
         if "おすすめ投稿" in date_element.text or "Recommended post" in date_element.text:
             try:
                 img_element = post.find_element(By.CSS_SELECTOR, ".PostPreviewImageView_post_image__zLzXH")
@@ -216,269 +543,567 @@ def scrape_images(driver, artist_name, max_scroll_times=50, scroll_delay=2):
             except NoSuchElementException:
                 logging.info(f"Identified a pinned post without an image. Skipping this post.")
                 continue
+    return pinned_img_links
 
-    while True:
-        # Scroll down
-        driver.execute_script("window.scrollBy(0, 2000);")
-        scroll_count += 1
-        logging.info(f"Scrolled {scroll_count} times.")
+def observe_posts(ctx, stop, preview_urls, post_ids, page_type):
+    """
+    Feed the posts of a scroll to a StopCondition, in page order.
+
+    A post counts as saved when its preview image, or any of its resolved media, is in the index of saved URLs.
 
-        # Wait for content to load
-        time.sleep(scroll_delay)
+    Returns:
+    - True once the StopCondition has seen enough known posts in a row.
+    """
+    resolved = {}
+    if ctx.media_resolver is not None:
+        resolved = ctx.media_resolver.cached(post_ids[url] for url in preview_urls if url in post_ids)
+    for url in preview_urls:
+        post_id = post_ids.get(url)
+        urls = [clean_url(url)] + resolved.get(post_id, [])
+        if stop.observe(post_id, saved=bool(ctx.url_store.filter_seen(urls, page_type))):
+            return True
+    return False
+
+def scroll_page_images(ctx, driver, artist_name, page_type, max_scroll_times=50, scroll_delay=2):
+    """
+    Scroll an artist's page and download its new images.
+
+    Scrolling stops once `STOP_AFTER_KNOWN_POSTS` posts in a row are older than the page's high-water mark
+    or already saved, so the number of scrolls follows the number of new posts. At the end, the newest post
+    seen becomes the page's mark for the next run.
+
+    Args:
+    - ctx: The ScraperContext of the run.
+    - driver: The Selenium WebDriver instance, on the page to scroll.
+    - artist_name: The artist the page belongs to.
+    - page_type: "feed" or "artist".
+    - max_scroll_times: The maximum number of scrolls.
+    - scroll_delay: The maximum time to wait for new content after a scroll.
+
+    Returns:
+    - The list of new image URLs.
+    """
+    if ctx.api_client is not None:
+        return save_new_images(ctx, scrape_images_from_api(ctx, artist_name, page_type), artist_name, page_type)
+
+    scroll_count = 0
+    all_images = set()
+    submitted_urls = set()
+    pinned_img_links = find_pinned_images(driver, artist_name, page_type)
+    stop = StopCondition(ctx.post_marks.get(artist_name, page_type), known_posts=ctx.config.stop_after_known_posts)
+
+    # Watch the page for newly appended post images
+    scroll_engine = ScrollEngine(driver, timeout=scroll_delay)
+    scroll_engine.install()
 
-        # Extract post images
-        post_images = driver.find_elements(By.CSS_SELECTOR, ".PostPreviewImageView_post_image__zLzXH")
-        post_img_links = {clean_url(img.get_attribute("src")) for img in post_images} - set(pinned_img_links)
+    while True:
+        # Scroll down and collect only the images appended since the last scroll
+        with metrics.timed("scroll_iteration", artist=artist_name, page_type=page_type):
+            preview_urls = [url for url in scroll_engine.scroll() if clean_url(url) not in pinned_img_links]
+        # Posts older than the mark were on the page last run, so even if their URLs were trimmed they aren't new
+        new_previews = [url for url in preview_urls if not stop.older(scroll_engine.post_ids.get(url))]
+        post_img_links = expand_media(ctx, new_previews, scroll_engine.post_ids, page_type) - all_images
+        scroll_count += 1
+        logging.info(f"Scrolled {scroll_count} times, found {len(post_img_links)} new image(s).")
 
         # Update all_images set
         all_images.update(post_img_links)
 
-        # If any of the currently found images matches a saved image URL or we've scrolled too many times, break the loop
-        matching_saved_images = [url for url in post_img_links if url in existing_urls]
-        if matching_saved_images:
-            logging.info(f"Found saved image(s): {matching_saved_images}. Stopping the scroll.")
+        # Checked before the new images are handed to the pipeline, whose downloads would otherwise count as known
+        reached_known_posts = observe_posts(ctx, stop, preview_urls, scroll_engine.post_ids, page_type)
+
+        # In pipeline mode the new images start downloading while scrolling continues
+        if ctx.pipeline is not None:
+            new_links = post_img_links - ctx.url_store.filter_seen(post_img_links, page_type)
+            submit_new_images(ctx, list(new_links), artist_name, page_type)
+            submitted_urls.update(new_links)
+
+        # Stop once this scroll has reached the posts earlier runs saw, or we've scrolled too many times
+        if reached_known_posts:
+            logging.info(f"Found {stop.consecutive} known posts in a row. Stopping the scroll.")
+            break
+        elif scroll_engine.reached_end:
+            logging.info("No more posts are loading. Stopping the scroll.")
             break
         elif scroll_count >= max_scroll_times:
             logging.warning(f"Reached maximum scroll times ({max_scroll_times}). Stopping the scroll.")
             break
 
+    if stop.newest is not None:
+        ctx.post_marks.advance(artist_name, page_type, stop.newest)
+
+    # The pipeline has already queued every new image
+    if ctx.pipeline is not None:
+        return list(submitted_urls)
+
     # Filter out images already saved
-    new_image_urls = list(all_images - existing_urls)
-
-    # Create a directory named with the current timestamp if there are new images
-    if new_image_urls:
-        directory_name = f"downloaded_images/{artist_name}/feed/{EXECUTION_TIMESTAMP}"
-        if not os.path.exists(directory_name):
-            os.makedirs(directory_name)
-        logging.info(f"Created directory: {directory_name}")
-
-        # Download new images
-        for idx, img_url in enumerate(new_image_urls, 1):
-            img_response = requests.get(img_url, stream=True)
-            img_name = os.path.join(directory_name, f"image_{idx}.jpg")
-            with open(img_name, 'wb') as img_file:
-                for chunk in img_response.iter_content(chunk_size=1024):
-                    img_file.write(chunk)
-            logging.info(f"Downloaded {img_name}")
-
-        # Update the saved URLs
-        save_urls_to_file(existing_urls.union(new_image_urls), 'feed')
-
-        # Trim the saved URLs to keep only the most recent ones
-        trim_saved_urls(f"feed_saved_urls.txt", max_urls=MAX_FEED_URLS)
+    new_image_urls = list(all_images - ctx.url_store.filter_seen(all_images, page_type))
 
-    return new_image_urls
+    return save_new_images(ctx, new_image_urls, artist_name, page_type)
 
+def scrape_images(ctx, driver, artist_name, max_scroll_times=50, scroll_delay=2):
+    return scroll_page_images(ctx, driver, artist_name, "feed", max_scroll_times, scroll_delay)
 
+def scrape_artist_images(ctx, driver, artist_name, max_scroll_times=50, scroll_delay=2):
+    return scroll_page_images(ctx, driver, artist_name, "artist", max_scroll_times, scroll_delay)
 
-def scrape_artist_images(driver, artist_name, max_scroll_times=50, scroll_delay=2):
-    scroll_count = 0
-    all_images = set()  # Use a set to avoid duplicate URLs
+def iter_new_images(ctx, driver, artist_name, page_type, max_scroll_times, scroll_delay=2, skip_urls=()):
+    """
+    Scroll a page to its end and yield the media URLs that haven't been saved yet, one list per scroll.
 
-    # Load existing URLs
-    existing_urls = {clean_url(url) for url in load_urls_from_file("artist")}
+    Nothing accumulates across scrolls: every batch is checked against the on-disk URL index, the post IDs
+    of processed images are dropped, and the posts that have scrolled far out of view are emptied in the
+    page. Memory therefore stays flat however deep the page is scrolled. Saved images don't stop the
+    scroll, so an interrupted backfill can be run again to pick up where it stopped.
 
-    while True:
-        # Scroll down
-        driver.execute_script("window.scrollBy(0, 2000);")
-        scroll_count += 1
-        logging.info(f"Scrolled {scroll_count} times.")
+    Args:
+    - ctx: The ScraperContext of the run.
+    - driver: The Selenium WebDriver instance, on the page to scroll.
+    - artist_name: The artist the page belongs to.
+    - page_type: "feed" or "artist".
+    - max_scroll_times: The maximum number of scrolls.
+    - scroll_delay: The maximum time to wait for new content after a scroll.
+    - skip_urls: Image URLs to leave out, e.g. those of pinned posts.
+    """
+    scroll_engine = ScrollEngine(driver, timeout=scroll_delay)
+    scroll_engine.install()
+
+    for scroll_count in range(1, max_scroll_times + 1):
+        with metrics.timed("scroll_iteration", artist=artist_name, page_type=page_type):
+            preview_urls = [url for url in scroll_engine.scroll() if clean_url(url) not in skip_urls]
+        media_urls = expand_media(ctx, preview_urls, scroll_engine.post_ids, page_type)
+        scroll_engine.forget(preview_urls)
+        new_image_urls = media_urls - ctx.url_store.filter_seen(media_urls, page_type)
+        logging.info(f"Scrolled {scroll_count} times, found {len(new_image_urls)} new image(s).")
+        if new_image_urls:
+            yield list(new_image_urls)
+
+        # The images of the pruned posts have all been drained by the scroll above
+        scroll_engine.prune()
+        if scroll_engine.reached_end:
+            logging.info("No more posts are loading. Stopping the scroll.")
+            return
+    logging.warning(f"Reached maximum scroll times ({max_scroll_times}). Stopping the scroll.")
+
+def iter_new_images_from_api(ctx, artist_name, page_type, max_pages):
+    """
+    Page through the Weverse API down to a page's first post and yield the media URLs that haven't been
+    saved yet, one list per API page. Like `iter_new_images`, saved images don't stop the paging and
+    nothing accumulates across pages.
 
-        # Wait for content to load
-        time.sleep(scroll_delay)
+    Args:
+    - ctx: The ScraperContext of the run, with an API client.
+    - artist_name: The artist's URL path.
+    - page_type: "feed" or "artist".
+    - max_pages: The maximum number of API pages to request.
+    """
+    for page_count, posts in enumerate(ctx.api_client.iter_pages(artist_name, page_type, max_pages=max_pages), 1):
+        media_urls = {}
+        for post, post_img_links in page_media(ctx, posts):
+            media_urls.update((url, media_urls.get(url) or post.get("postId")) for url in post_img_links)
+        saved_urls = ctx.url_store.filter_seen(media_urls, page_type)
+        new_image_urls = [url for url in media_urls if url not in saved_urls]
+        if ctx.config.postprocess_images:
+            ctx.media_posts.update((url, media_urls[url]) for url in new_image_urls if media_urls[url])
+        logging.info(f"Fetched {page_count} API page(s), found {len(new_image_urls)} new image(s).")
+        if new_image_urls:
+            yield new_image_urls
+
+def backfill_page(ctx, driver, artist_name, page_type):
+    """
+    Download every image of a page down to its first post, saving each batch of images as soon as it is found.
+    In API fetch mode the posts are paged through the API, with `BACKFILL_MAX_SCROLLS` as the page limit.
 
-        # Extract post images
-        post_images = driver.find_elements(By.CSS_SELECTOR, ".PostPreviewImageView_post_image__zLzXH")
-        post_img_links = {clean_url(img.get_attribute("src")) for img in post_images}
+    Returns:
+    - The number of images that were downloaded, or queued for download in pipeline mode.
+    """
+    if ctx.api_client is not None:
+        saved_images = 0
+        for new_image_urls in iter_new_images_from_api(ctx, artist_name, page_type, ctx.config.backfill_max_scrolls):
+            saved_images += len(save_new_images(ctx, new_image_urls, artist_name, page_type))
+        return saved_images
+
+    skip_urls = find_pinned_images(driver, artist_name, page_type)
+    saved_images = 0
+    for new_image_urls in iter_new_images(ctx, driver, artist_name, page_type, ctx.config.backfill_max_scrolls,
+                                          skip_urls=skip_urls):
+        saved_images += len(save_new_images(ctx, new_image_urls, artist_name, page_type))
+    return saved_images
 
+user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 
-        # Update all_images set
-        all_images.update(post_img_links)
+def create_driver(user_data_dir=None):
+    """
+    Launch a headless Chrome WebDriver using the custom User Agent.
 
-        # If any of the currently found images matches a saved image URL or we've scrolled too many times, break the loop
-        matching_saved_images = [url for url in all_images if url in existing_urls]
-        if matching_saved_images:
-            logging.info(f"Found saved image(s): {matching_saved_images}. Stopping the scroll.")
-            break
-        elif scroll_count >= max_scroll_times:
-            logging.warning(f"Reached maximum scroll times ({max_scroll_times}). Stopping the scroll.")
-            break
+    Args:
+    - user_data_dir: An optional Chrome profile directory to keep the browser state between runs.
+    """
+    # undetected_chromedriver patches the driver binary on import, so it is only loaded when a browser is needed
+    import undetected_chromedriver as uc
 
-    # Filter out images already saved
-    new_image_urls = list(set(clean_url(url) for url in all_images) - existing_urls)
-
-    # Create a directory named with the current timestamp if there are new images
-    if new_image_urls:
-        directory_name = f"downloaded_images/{artist_name}/artist/{EXECUTION_TIMESTAMP}"
-        if not os.path.exists(directory_name):
-            os.makedirs(directory_name)
-        logging.info(f"Created directory: {directory_name}")
-
-        # Download new images
-        for idx, img_url in enumerate(new_image_urls, 1):
-            img_response = requests.get(img_url, stream=True)
-            img_name = os.path.join(directory_name, f"image_{idx}.jpg")
-            with open(img_name, 'wb') as img_file:
-                for chunk in img_response.iter_content(chunk_size=8192):
-                    img_file.write(chunk)
-            logging.info(f"Saved image {idx} to {img_name}")
-
-    # Save new URLs
-    save_urls_to_file(existing_urls.union(new_image_urls), 'artist')
-
-    # Trim the saved URLs to keep only the most recent ones
-    trim_saved_urls(f"artist_saved_urls.txt")
-    trim_saved_urls(f"artist_saved_urls.txt", max_urls=MAX_ARTIST_URLS)
+    # Set up Chrome options to use the custom User Agent
+    chrome_options = webdriver.ChromeOptions()
+    chrome_options.add_argument(f"user-agent={user_agent}")
+    # chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument("--log-level=3")
+    chrome_options.add_argument("--headless")
 
-    return new_image_urls
+    # Initialize the WebDriver with the options
+    return uc.Chrome(options=chrome_options, user_data_dir=user_data_dir)
 
-user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+def scrape_page(ctx, driver, artist, page_type):
+    """
+    Open an artist's feed or artist page and scrape its new images.
 
-# Set up Chrome options to use the custom User Agent
-chrome_options = webdriver.ChromeOptions()
-chrome_options.add_argument(f"user-agent={user_agent}")
-# chrome_options.add_argument("--window-size=1920,1080")
-chrome_options.add_argument("--log-level=3")
-chrome_options.add_argument("--headless")
+    Args:
+    - ctx: The ScraperContext of the run.
+    - driver: The Selenium WebDriver instance, or None in API fetch mode.
+    - artist: The artist's URL path.
+    - page_type: "feed" or "artist".
+
+    Returns:
+    - The number of new images.
+    """
+    # Posts are fetched from the API directly, so the pages only need to be opened in browser mode
+    if ctx.api_client is None:
+        open_page(ctx, driver, artist, page_type)
+
+    logging.info(f"Starting image scraping for {artist}'s {page_type} page")
+    if ctx.config.backfill_mode:
+        new_images = backfill_page(ctx, driver, artist, page_type)
+    elif page_type == "feed":
+        new_images = len(scrape_images(ctx, driver, artist))
+    else:
+        new_images = len(scrape_artist_images(ctx, driver, artist))
+    page_name = "feed" if page_type == "feed" else "artist page"
+    logging.info(f"Scraped {new_images} new images from {artist}'s {page_name}.")
+    return new_images
 
-# Initialize the WebDriver with the options
-driver = uc.Chrome(options=chrome_options)
+def login(ctx, driver):
+    """
+    Log into Weverse with the configured credentials.
 
-# Navigate to the login page
-driver.get("https://account.weverse.io/ja/login/redirect?client_id=weverse&redirect_uri=https%3A%2F%2Fweverse.io%2FloginResult%3Ftopath%3D%252F")
+    Args:
+    - ctx: The ScraperContext of the run.
+    - driver: The Selenium WebDriver instance.
 
-time.sleep(2)
+    Returns:
+    - True if the login succeeded.
+    """
+    with metrics.timed("login"):
+        return _login(ctx, driver)
 
-# Print the current url
-logging.info(f"URL: {driver.current_url}")
+def _login(ctx, driver):
+    # Navigate to the login page
+    driver.get("https://account.weverse.io/ja/login/redirect?client_id=weverse&redirect_uri=https%3A%2F%2Fweverse.io%2FloginResult%3Ftopath%3D%252F")
 
-# Use WebDriverWait to ensure the email input is present and interactable
-email_elem = WebDriverWait(driver, 10).until(
-    EC.element_to_be_clickable((By.NAME, 'email'))
-)
-email_elem.send_keys(EMAIL)
+    time.sleep(2)
 
-# Add a delay or wait for the password field to be available again after entering the email
-WebDriverWait(driver, 10).until(
-    EC.presence_of_element_located((By.NAME, 'password'))
-)
+    # Print the current url
+    logging.info(f"URL: {driver.current_url}")
 
-time.sleep(2)
+    # Use WebDriverWait to ensure the email input is present and interactable
+    email_elem = WebDriverWait(driver, 10).until(
+        EC.element_to_be_clickable((By.NAME, 'email'))
+    )
+    email_elem.send_keys(ctx.config.email)
 
-# Similarly for the password input
-password_elem = WebDriverWait(driver, 10).until(
-    EC.element_to_be_clickable((By.NAME, 'password'))
-)
-# Find the password input again
-password_elem = driver.find_element(By.NAME, 'password')
-password_elem.send_keys(PASSWORD)
+    # Add a delay or wait for the password field to be available again after entering the email
+    WebDriverWait(driver, 10).until(
+        EC.presence_of_element_located((By.NAME, 'password'))
+    )
 
-time.sleep(2)
+    time.sleep(2)
 
-# Print the content of the <h1> tag
-logging.info(f"h1: {get_h1_text(driver)}")
+    # Similarly for the password input
+    password_elem = WebDriverWait(driver, 10).until(
+        EC.element_to_be_clickable((By.NAME, 'password'))
+    )
+    # Find the password input again
+    password_elem = driver.find_element(By.NAME, 'password')
+    password_elem.send_keys(ctx.config.password)
 
+    time.sleep(2)
 
-# Find and click the login button
-login_button = WebDriverWait(driver, 10).until(
-    EC.element_to_be_clickable((By.CSS_SELECTOR, "button[type='submit']"))
-)
-login_button.click()
+    # Print the content of the <h1> tag
+    logging.info(f"h1: {get_h1_text(driver)}")
 
-time.sleep(10)
+    # Find and click the login button
+    login_button = WebDriverWait(driver, 10).until(
+        EC.element_to_be_clickable((By.CSS_SELECTOR, "button[type='submit']"))
+    )
+    login_button.click()
 
-screenshot(driver, "after_login")
+    time.sleep(10)
 
-h1_after_login = get_h1_text(driver)
-logging.info(f"h1: {get_h1_text(driver)}")
+    screenshot(driver, "after_login", ctx.screenshot_dir)
 
-# Handle additional login steps if necessary
+    h1_after_login = get_h1_text(driver)
+    logging.info(f"h1: {get_h1_text(driver)}")
 
+    # Handle additional login steps if necessary
 
-if h1_after_login != "weverse":
-    logging.info("There's something wrong with the login process")
+    if h1_after_login != "weverse":
+        logging.info("There's something wrong with the login process")
 
-    try:
-        logging.info("Checking for email code input...")
-        email_code_input = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.ID, 'otpCode'))
-        )
-        if email_code_input:
-            logging.info("Email code input found. Prompting user for email code...")
-            email_code = input("Enter the code sent to your email: ")
-            email_code_input.send_keys(email_code)
-            logging.info("Email code entered.")
-
-            # Always try to click the confirmation button first
-            click_confirmation_button(driver)
-
-            logging.info("Trying to click submit button...")
-            if click_submit_button(driver):
-                logging.info("Checking for confirmation button again...")
+        try:
+            logging.info("Checking for email code input...")
+            email_code_input = WebDriverWait(driver, 10).until(
+                EC.presence_of_element_located((By.ID, 'otpCode'))
+            )
+            if email_code_input:
+                # Unattended runs can't answer the prompt, so give up instead of blocking forever
+                if not sys.stdin.isatty():
+                    ctx.send_discord_alert("Login Requires Email Code", "Weverse asked for an email code, but the scraper is not running interactively.")
+                    return False
+                logging.info("Email code input found. Prompting user for email code...")
+                email_code = input("Enter the code sent to your email: ")
+                email_code_input.send_keys(email_code)
+                logging.info("Email code entered.")
+
+                # Always try to click the confirmation button first
                 click_confirmation_button(driver)
-    except NoSuchElementException:
-        logging.info("No additional login step required.")
 
-time.sleep(10)
+                logging.info("Trying to click submit button...")
+                if click_submit_button(driver):
+                    logging.info("Checking for confirmation button again...")
+                    click_confirmation_button(driver)
+        except NoSuchElementException:
+            logging.info("No additional login step required.")
+
+    time.sleep(10)
+
+    h1_after_login = get_h1_text(driver)
+    logging.info(f"h1: {get_h1_text(driver)}")
 
-h1_after_login = get_h1_text(driver)
-logging.info(f"h1: {get_h1_text(driver)}")
+    return h1_after_login == "weverse"
 
-if h1_after_login == "weverse":
-    logging.info("Successfully logged in!")
+def restore_session(ctx, driver):
+    """
+    Restore the login from the session cache or the Chrome profile and check that it is still valid.
 
-    for artist in ARTISTS:
-        logging.info(f"Processing artist: {artist}")
+    Returns:
+    - True if the driver is logged in.
+    """
+    with metrics.timed("restore_session"):
+        return _restore_session(ctx, driver)
+
+def _restore_session(ctx, driver):
+    session_cache = ctx.session_cache
+    session_state = session_cache.load() if session_cache is not None else None
+    if session_state is not None:
+        logging.info("Restoring cached login session...")
+        import_session(driver, session_state)
+    elif ctx.config.chrome_profile_dir:
+        logging.info(f"Checking for a login session in the Chrome profile {ctx.config.chrome_profile_dir}...")
+        driver.get("https://weverse.io/")
+    else:
+        return False
 
-        desired_url_after_login = f"https://weverse.io/{artist}/feed"
-        logging.info(f"Navigating to {desired_url_after_login}")
-        driver.get(desired_url_after_login)
+    try:
+        WebDriverWait(driver, 10).until(EC.text_to_be_present_in_element((By.TAG_NAME, 'h1'), "weverse"))
+        logged_in = any(cookie["name"] == "we2_access_token" for cookie in driver.get_cookies())
+    except TimeoutException:
+        logged_in = False
 
-        time.sleep(5)
-        logging.info(f"Taking a screenshot for artist {artist}'s feed after navigation")
-        screenshot(driver, f"{artist}_feed_after_login")
+    if not logged_in:
+        logging.info("Cached login session is no longer valid.")
+        if session_cache is not None:
+            session_cache.clear()
+    return logged_in
 
-        logging.info(f"Starting image scraping for artist {artist}")
-        # Scrape images from the artist's feed page
-        if artist not in SKIP_FEED_ARTISTS:
-            scraped_feed_image_urls = scrape_images(driver, artist)
-            logging.info(f"Scraped {len(scraped_feed_image_urls)} new images from {artist}'s feed.")
-        else:
-            logging.info(f"Skipping scraping for {artist}'s feed as per configuration.")
+def ensure_logged_in(ctx, driver):
+    """
+    Reuse the cached session if it is still valid, and only log in again when it has expired.
+
+    Returns:
+    - True if the driver is logged in.
+    """
+    if restore_session(ctx, driver):
+        logging.info("Restored cached login session.")
+        return True
+    if login(ctx, driver):
+        if ctx.session_cache is not None:
+            ctx.session_cache.save(export_session(driver))
+        return True
+    return get_h1_text(driver) == "weverse"
 
-        # Navigate to the artist's artist page
-        artist_page_url = f"https://weverse.io/{artist}/artist"
-        driver.get(artist_page_url)
+def create_api_client(ctx, driver):
+    return WeverseApiClient.from_driver(driver, base_url=ctx.config.weverse_api_base, hmac_key=ctx.config.weverse_api_hmac_key)
 
-        time.sleep(5)
-        logging.info(f"Taking a screenshot for artist {artist}'s artist page after navigation")
-        screenshot(driver, f"{artist}_artist_page_after_login")
+def relogin(ctx, driver):
+    """
+    Log in again after the session expired while running as a daemon.
 
-        # Scrape images from the artist's artist page
-        if artist not in SKIP_ARTIST_PAGE_ARTISTS:
-            scraped_artist_image_urls = scrape_artist_images(driver, artist)
-            logging.info(f"Scraped {len(scraped_artist_image_urls)} new images from {artist}'s artist page.")
+    Returns:
+    - True if the driver is logged in again.
+    """
+    logged_in = ensure_logged_in(ctx, driver)
+    if logged_in and ctx.api_client is not None:
+        ctx.api_client.close()
+        ctx.api_client = create_api_client(ctx, driver)
+    if logged_in and ctx.media_resolver is not None:
+        ctx.media_resolver.client.close()
+        ctx.media_resolver.client = create_api_client(ctx, driver)
+    return logged_in
+
+def page_jobs(config):
+    """
+    Return the (artist, page_type) pages to scrape, leaving out the skipped ones.
+    """
+    jobs = []
+    for artist in config.artists:
+        if artist not in config.skip_feed_artists:
+            jobs.append((artist, "feed"))
+        else:
+            logging.info(f"Skipping scraping for {artist}'s feed as per configuration.")
+        if artist not in config.skip_artist_page_artists:
+            jobs.append((artist, "artist"))
         else:
             logging.info(f"Skipping scraping for {artist}'s artist page as per configuration.")
+    return jobs
 
-        logging.info(f"Finished processing artist: {artist}")
+def run_daemon(ctx, driver, jobs):
+    """
+    Keep polling the given pages with the warm driver and session until the process is stopped.
+    Each page is polled on its own interval, which adapts to how often the artist posts new images.
 
-# After scraping for all artists, start the syncing process
-if ENABLE_DROPBOX_SYNC:
-    for artist in ARTISTS:
-        local_directory = f"./downloaded_images/{artist}"
-        dropbox_directory = f"/weverse/{artist}"
+    Args:
+    - ctx: The ScraperContext of the run.
+    - driver: The logged-in Selenium WebDriver instance.
+    - jobs: A list of (artist, page_type) tuples.
+    """
+    config = ctx.config
+    if config.metrics_port:
+        metrics.serve(config.metrics_port)
 
-        try:
-            logging.info(f"Starting Dropbox sync for artist {artist}...")
-            bot.sync_folder(local_directory, dropbox_directory)
-            logging.info(f"Completed Dropbox sync for artist {artist}.")
-        except Exception as e:
-            error_title = f"Error for Artist: {artist}"
-            error_description = f"Error during Dropbox sync: {e}"
-            logging.error(f"{error_title} - {error_description}")
-            send_discord_alert(error_title, error_description)
+    schedule = AdaptiveSchedule(min_interval=config.daemon_min_interval, max_interval=config.daemon_max_interval)
+    for artist, page_type in jobs:
+        schedule.add((artist, page_type), ctx.url_store.added_times(artist, page_type))
+
+    # Stop cleanly when the service manager sends SIGTERM
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
 
-# Close the browser
-driver.close()
+    try:
+        while True:
+            due_at, (artist, page_type) = schedule.pop_next()
+            time.sleep(max(0, due_at - time.time()))
 
+            # Every poll gets its own directory and retries the unfinished downloads, like a separate run would
+            ctx.execution_timestamp = new_execution_timestamp()
+            ctx.resumed_pages.clear()
+            try:
+                new_images = scrape_page(ctx, driver, artist, page_type)
+            except Exception as e:
+                error_title = f"Error for Artist: {artist}"
+                error_description = f"Error while scraping the {page_type} page: {e}"
+                logging.error(f"{error_title} - {error_description}")
+                ctx.send_discord_alert(error_title, error_description)
+                if not relogin(ctx, driver):
+                    logging.error("Could not log in again. Stopping the daemon.")
+                    return
+                new_images = 0
+            schedule.record((artist, page_type), new_images)
+            metrics.inc("new_images_total", new_images, artist=artist, page_type=page_type)
+            if config.metrics_textfile:
+                metrics.write_textfile(config.metrics_textfile)
+
+            if ctx.pipeline is not None or ctx.async_engine is not None:
+                ctx.checkpoint.remove_finished()
+                ctx.url_store.trim(page_type, max_urls=config.max_urls(page_type))
+            elif new_images and config.enable_dropbox_sync:
+                try:
+                    if config.postprocess_images:
+                        # The manifests and thumbnails are journaled once written, so they are synced with the images
+                        ctx.postprocessor.drain()
+                    ctx.bot.sync_journal(ctx.sync_journal, config.download_dir, config.dropbox_root)
+                except Exception as e:
+                    logging.error(f"Error during Dropbox sync: {e}")
+                    ctx.send_discord_alert("Error during Dropbox Sync", f"Error during Dropbox sync: {e}")
+    except (KeyboardInterrupt, SystemExit):
+        logging.info("Stopping the daemon.")
+
+def scrape_all(ctx, driver):
+    """
+    Scrape every configured page with the logged-in driver, or keep polling them in daemon mode.
+
+    Args:
+    - ctx: The ScraperContext of the run.
+    - driver: The logged-in Selenium WebDriver instance.
+
+    Returns:
+    - A list of (artist, page_type, exception) tuples for the pages that failed.
+    """
+    config = ctx.config
+
+    if config.fetch_mode == "api":
+        logging.info(f"Fetching posts through the Weverse API at {config.weverse_api_base}.")
+        ctx.api_client = create_api_client(ctx, driver)
+
+    if config.resolve_media:
+        logging.info("Resolving every post into its full-resolution photos and videos.")
+        ctx.media_resolver = MediaResolver(create_api_client(ctx, driver), config.media_cache_db, workers=config.media_resolve_workers)
+
+    if config.async_mode:
+        logging.info("Downloading and uploading the images of many pages at once on an event loop.")
+        ctx.async_engine = create_async_engine(ctx)
+    elif config.pipeline_mode:
+        logging.info("Downloading and uploading images while scraping.")
+        ctx.pipeline = create_pipeline(ctx)
+
+    jobs = page_jobs(config)
+    handler = partial(scrape_page, ctx)
+
+    if config.daemon_mode:
+        logging.info(f"Running as a daemon, polling {len(jobs)} pages.")
+        run_daemon(ctx, driver, jobs)
+        failed_jobs = []
+    elif config.scrape_workers > 1 and ctx.api_client is None:
+        logging.info(f"Scraping {len(jobs)} pages with {config.scrape_workers} browser workers.")
+        pool = BrowserWorkerPool(create_driver, export_session(driver), workers=config.scrape_workers)
+        failed_jobs = pool.run(jobs, handler, fallback_driver=driver)
+    elif config.scrape_workers > 1:
+        # API fetch mode doesn't need a browser per worker
+        logging.info(f"Scraping {len(jobs)} pages with {config.scrape_workers} API workers.")
+        with ThreadPoolExecutor(max_workers=config.scrape_workers) as executor:
+            futures = {executor.submit(handler, None, artist, page_type): (artist, page_type) for artist, page_type in jobs}
+        failed_jobs = [(*futures[future], future.exception()) for future in futures if future.exception()]
+    else:
+        failed_jobs = []
+        for artist, page_type in jobs:
+            logging.info(f"Processing {artist}'s {page_type} page")
+            try:
+                handler(driver, artist, page_type)
+            except Exception as e:
+                failed_jobs.append((artist, page_type, e))
+
+    for artist, page_type, e in failed_jobs:
+        error_title = f"Error for Artist: {artist}"
+        error_description = f"Error while scraping the {page_type} page: {e}"
+        logging.error(f"{error_title} - {error_description}")
+        ctx.send_discord_alert(error_title, error_description)
+
+    if ctx.pipeline is not None or ctx.async_engine is not None:
+        # Wait for the queued downloads and uploads to finish
+        if ctx.pipeline is not None:
+            ctx.pipeline.close()
+            ctx.pipeline = None
+        else:
+            engine, ctx.async_engine = ctx.async_engine, None
+            engine.close()
+        ctx.checkpoint.remove_finished()
+        if not config.backfill_mode:
+            ctx.url_store.trim("feed", max_urls=config.max_feed_urls)
+            ctx.url_store.trim("artist", max_urls=config.max_artist_urls)
+
+    if config.postprocess_images:
+        # The manifests and thumbnails are journaled once written, so they are synced with the images
+        ctx.postprocessor.drain()
+
+    return failed_jobs
+
+if __name__ == "__main__":
+    # Kept so existing `python scraper.py` invocations keep working
+    from cli import main
+    main(["scrape"] + sys.argv[1:])
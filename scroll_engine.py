@@ -0,0 +1,190 @@
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+POST_IMAGE_SELECTOR = ".PostPreviewImageView_post_image__zLzXH"
+POST_ITEM_SELECTOR = ".PostListItemView_post_item__XJ0uc"
+
+# Installs a MutationObserver that buffers the src of every post image appended to the page, together
+# with the ID of its post (e.g. "2-123456789") taken from the post's link, if it has one.
+# Images already on the page when the observer is installed are buffered as well.
+INSTALL_SCRIPT = """
+const [selector, postSelector] = arguments;
+if (window.__scraperImageBuffer) {
+    return;
+}
+const buffer = [];
+const seen = new Set();
+window.__scraperImageSeen = seen;
+const postIdOf = (element) => {
+    const post = element.closest(postSelector);
+    if (!post) {
+        return null;
+    }
+    for (const link of post.querySelectorAll('a[href]')) {
+        const match = link.getAttribute('href').match(/\\/(\\d+-\\d+)(?:[/?#]|$)/);
+        if (match) {
+            return match[1];
+        }
+    }
+    return null;
+};
+const collect = (element) => {
+    const src = element.getAttribute('src');
+    if (src && !seen.has(src)) {
+        seen.add(src);
+        buffer.push([src, postIdOf(element)]);
+    }
+};
+const collectTree = (node) => {
+    if (node.nodeType !== Node.ELEMENT_NODE) {
+        return;
+    }
+    if (node.matches(selector)) {
+        collect(node);
+    }
+    node.querySelectorAll(selector).forEach(collect);
+};
+window.__scraperImageBuffer = buffer;
+window.__scraperImageObserver = new MutationObserver((mutations) => {
+    for (const mutation of mutations) {
+        if (mutation.type === 'attributes') {
+            if (mutation.target.matches(selector)) {
+                collect(mutation.target);
+            }
+        } else {
+            mutation.addedNodes.forEach(collectTree);
+        }
+    }
+});
+window.__scraperImageObserver.observe(document.body, {
+    childList: true, subtree: true, attributes: true, attributeFilter: ['src']
+});
+collectTree(document.body);
+"""
+
+# Scrolls once, then resolves as soon as new images were buffered, the page height has stopped
+# changing for `settleMs`, or `timeoutMs` has elapsed. Returns the drained buffer in one round-trip.
+SCROLL_SCRIPT = """
+const [distance, timeoutMs, settleMs, done] = arguments;
+const buffer = window.__scraperImageBuffer;
+const started = Date.now();
+let lastHeight = document.body.scrollHeight;
+let lastChange = started;
+window.scrollBy(0, distance);
+const poll = () => {
+    const now = Date.now();
+    const height = document.body.scrollHeight;
+    if (height !== lastHeight) {
+        lastHeight = height;
+        lastChange = now;
+    }
+    if (buffer.length > 0 || now - lastChange >= settleMs || now - started >= timeoutMs) {
+        done({images: buffer.splice(0, buffer.length), height: height});
+    } else {
+        setTimeout(poll, 50);
+    }
+};
+setTimeout(poll, 50);
+"""
+
+# Hollows out the post items that have scrolled more than `margin` pixels above the viewport: their
+# children are removed and their height is fixed, so the page layout and scroll position stay the same
+# while the browser can free the images. Their srcs are dropped from the observer's set of seen images.
+PRUNE_SCRIPT = """
+const [postSelector, selector, margin] = arguments;
+const seen = window.__scraperImageSeen;
+let pruned = 0;
+for (const post of document.querySelectorAll(postSelector)) {
+    if (post.dataset.scraperPruned) {
+        continue;
+    }
+    const rect = post.getBoundingClientRect();
+    if (rect.bottom > -margin) {
+        break;
+    }
+    if (seen) {
+        post.querySelectorAll(selector).forEach((image) => seen.delete(image.getAttribute('src')));
+    }
+    post.style.height = `${rect.height}px`;
+    post.replaceChildren();
+    post.dataset.scraperPruned = '1';
+    pruned++;
+}
+return pruned;
+"""
+
+
+class ScrollEngine:
+    """
+    Event-driven replacement for the fixed `scrollBy` + `sleep` + `find_elements` loop.
+
+    A MutationObserver injected into the page buffers the src of every newly appended post image.
+    Each call to `scroll` scrolls once and drains that buffer through a single `execute_async_script`,
+    returning as soon as new images show up or the page height stops changing. Each iteration only
+    transfers the images that are new since the previous one. The post ID of every image is kept in
+    `post_ids`, so the full media of its post can be resolved.
+    """
+
+    def __init__(self, driver, selector=POST_IMAGE_SELECTOR, scroll_distance=2000, timeout=2, settle=0.75,
+                 max_idle_scrolls=3, post_selector=POST_ITEM_SELECTOR):
+        self.driver = driver
+        self.selector = selector
+        self.post_selector = post_selector
+        self.scroll_distance = scroll_distance
+        self.timeout = timeout
+        self.settle = settle
+        self.max_idle_scrolls = max_idle_scrolls
+        self.idle_scrolls = 0
+        self.last_height = None
+        self.post_ids = {}
+
+    def install(self):
+        self.driver.set_script_timeout(self.timeout + 10)
+        self.driver.execute_script(INSTALL_SCRIPT, self.selector, self.post_selector)
+
+    def scroll(self):
+        """
+        Scroll down once and return the src of the images that were appended since the last call.
+        """
+        result = self.driver.execute_async_script(
+            SCROLL_SCRIPT, self.scroll_distance, int(self.timeout * 1000), int(self.settle * 1000)
+        )
+        urls = []
+        for src, post_id in result["images"]:
+            urls.append(src)
+            if post_id:
+                self.post_ids[src] = post_id
+
+        if urls or result["height"] != self.last_height:
+            self.idle_scrolls = 0
+        else:
+            self.idle_scrolls += 1
+        self.last_height = result["height"]
+
+        return urls
+
+    def prune(self, margin=5000):
+        """
+        Empty the post items that have scrolled far above the viewport, so a deep scroll doesn't keep every post in the DOM.
+
+        Only call this once the images of those posts have been drained with `scroll`.
+
+        Returns:
+        - The number of post items that were emptied.
+        """
+        return self.driver.execute_script(PRUNE_SCRIPT, self.post_selector, self.selector, margin)
+
+    def forget(self, urls):
+        """
+        Drop the post IDs of images that have been processed.
+        """
+        for url in urls:
+            self.post_ids.pop(url, None)
+
+    @property
+    def reached_end(self):
+        """
+        True when several scrolls in a row neither loaded new images nor changed the page height.
+        """
+        return self.idle_scrolls >= self.max_idle_scrolls
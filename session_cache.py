@@ -0,0 +1,102 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import time
+
+from cryptography.fernet import Fernet, InvalidToken
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Cookies holding the Weverse login, used to work out when the cached session expires
+AUTH_COOKIES = ("we2_access_token", "we2_refresh_token")
+
+
+def _jwt_expiry(token):
+    """
+    Return the `exp` claim of a JWT, or None if the token isn't a JWT.
+    """
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, KeyError, ValueError, TypeError):
+        return None
+
+
+def session_expiry(session_state, max_age=7 * 24 * 3600):
+    """
+    Work out when an exported session expires.
+
+    The expiry of the refresh token wins over the access token, because an expired access token is
+    renewed by the web app on the next page load. Sessions without any expiry information are
+    considered valid for `max_age` seconds.
+    """
+    expiries = {}
+    for cookie in session_state["cookies"]:
+        if cookie["name"] in AUTH_COOKIES:
+            expiry = _jwt_expiry(cookie["value"]) or cookie.get("expiry")
+            if expiry:
+                expiries[cookie["name"]] = float(expiry)
+
+    for name in reversed(AUTH_COOKIES):
+        if name in expiries:
+            return expiries[name]
+    return time.time() + max_age
+
+
+class SessionCache:
+    """
+    Encrypted on-disk cache of the logged-in Weverse session.
+
+    The cookies and local storage exported after a successful login are encrypted with a key derived
+    from `SESSION_CACHE_KEY` and stored together with their expiry time, so the next run can skip the
+    login flow until the session expires.
+    """
+
+    def __init__(self, path, passphrase):
+        self.path = path
+        key = base64.urlsafe_b64encode(hashlib.sha256(passphrase.encode()).digest())
+        self.fernet = Fernet(key)
+
+    def save(self, session_state):
+        expires_at = session_expiry(session_state)
+        data = json.dumps(dict(session_state, saved_at=time.time(), expires_at=expires_at)).encode()
+
+        # Write to a temporary file first so a crash never leaves a corrupt cache behind
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(self.fernet.encrypt(data))
+        os.chmod(temp_path, 0o600)
+        os.replace(temp_path, self.path)
+        logging.info(f"Cached login session until {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(expires_at))}.")
+
+    def load(self, min_remaining=300):
+        """
+        Load the cached session.
+
+        Args:
+        - min_remaining: Sessions expiring within this many seconds are treated as expired.
+
+        Returns:
+        - The cached session, or None if there is no usable session.
+        """
+        if not os.path.exists(self.path):
+            return None
+
+        try:
+            with open(self.path, 'rb') as f:
+                session_state = json.loads(self.fernet.decrypt(f.read()))
+        except (InvalidToken, ValueError) as e:
+            logging.warning(f"Ignoring unreadable session cache {self.path}: {e!r}")
+            return None
+
+        if session_state["expires_at"] - time.time() < min_remaining:
+            logging.info("Cached login session has expired.")
+            return None
+        return session_state
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
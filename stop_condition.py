@@ -0,0 +1,140 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# The newest post of a page seen by a run. published_at is only known in API fetch mode.
+Mark = namedtuple("Mark", ["post_id", "published_at"])
+
+
+def post_order(post_id):
+    """
+    Return the sequence number of a post ID like "2-123456789", which grows with every new post, or None.
+    """
+    try:
+        return int(str(post_id).rsplit('-', 1)[-1])
+    except ValueError:
+        return None
+
+
+def is_newer(post, than):
+    """
+    Tell whether one Mark is newer than another, by publication time if both have one, otherwise by post ID.
+
+    Returns:
+    - True or False, or None if the two can't be compared.
+    """
+    if post.published_at is not None and than.published_at is not None:
+        return post.published_at > than.published_at
+    order, than_order = post_order(post.post_id), post_order(than.post_id)
+    if order is None or than_order is None:
+        return None
+    return order > than_order
+
+
+class PostMarks:
+    """
+    Persistent high-water mark of every page: the newest post seen by the last run that scraped it.
+    """
+
+    def __init__(self, path="post_marks.db"):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS marks (
+                artist TEXT NOT NULL,
+                page_type TEXT NOT NULL,
+                post_id TEXT NOT NULL,
+                published_at REAL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (artist, page_type)
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, artist, page_type):
+        """
+        Return the page's Mark, or None if no run has recorded one yet.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT post_id, published_at FROM marks WHERE artist = ? AND page_type = ?", (artist, page_type)
+            ).fetchone()
+        return Mark(*row) if row else None
+
+    def advance(self, artist, page_type, mark):
+        """
+        Move the page's mark to the given post, unless the recorded mark is at least as new.
+        """
+        with self.lock:
+            current = self.get(artist, page_type)
+            if current is not None and not is_newer(mark, current):
+                return
+            self.conn.execute(
+                "INSERT OR REPLACE INTO marks (artist, page_type, post_id, published_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (artist, page_type, mark.post_id, mark.published_at, time.time()),
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class StopCondition:
+    """
+    Decides when scrolling or paging through a page, newest post first, has reached what earlier runs saw.
+
+    A post is known when it is not newer than the page's high-water mark, or when its images are already
+    saved. Scrolling stops after `known_posts` known posts in a row, so a few old pinned posts at the top
+    or posts shown out of order don't stop it early, and a post whose URLs were trimmed from the index
+    doesn't make it scroll to the limit. Meanwhile the newest post seen is kept as the next mark.
+    """
+
+    def __init__(self, mark=None, known_posts=3):
+        self.mark = mark
+        self.known_posts = known_posts
+        self.consecutive = 0
+        self.newest = None
+        self.seen = set()
+
+    def older(self, post_id, published_at=None):
+        """
+        Tell whether a post is older than the high-water mark, i.e. was already on the page during the last run.
+        """
+        if self.mark is None or post_id is None:
+            return False
+        return is_newer(Mark(post_id, published_at), self.mark) is False
+
+    def observe(self, post_id, published_at=None, saved=False):
+        """
+        Count the next post of the page, in page order.
+
+        Args:
+        - post_id: The post's ID, or None if it isn't known.
+        - published_at: The post's publication time, if known.
+        - saved: Whether the post's images are already saved.
+
+        Returns:
+        - True once enough known posts have been seen in a row to stop.
+        """
+        if post_id is not None:
+            if post_id in self.seen:
+                return self.stopped
+            self.seen.add(post_id)
+
+        post = Mark(post_id, published_at)
+        if post_id is not None and (self.newest is None or is_newer(post, self.newest)):
+            self.newest = post
+
+        self.consecutive = self.consecutive + 1 if saved or self.older(post_id, published_at) else 0
+        return self.stopped
+
+    @property
+    def stopped(self):
+        return self.consecutive >= self.known_posts
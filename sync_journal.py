@@ -0,0 +1,125 @@
+import os
+import logging
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+JournalEntry = namedtuple("JournalEntry", ["id", "path", "size", "content_hash", "artist", "page_type"])
+
+
+class SyncJournal:
+    """
+    Local journal of the files written by the scraper that still have to be synced.
+
+    The download step records every new file, and the Dropbox sync only consumes the pending
+    entries and marks them as synced once they are committed, so sync cost scales with the new
+    content of a run instead of the size of the whole archive.
+    """
+
+    def __init__(self, path="sync_journal.db"):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS journal (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT NOT NULL UNIQUE,
+                directory TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                content_hash TEXT,
+                artist TEXT,
+                page_type TEXT,
+                created_at REAL NOT NULL,
+                synced_at REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS journal_pending ON journal (synced_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS journal_directory ON journal (directory, synced_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS journal_content_hash ON journal (content_hash)")
+        self.conn.commit()
+
+    def record(self, path, size, content_hash, artist, page_type):
+        """
+        Record a newly written file as pending. Recording the same path again marks it as pending again.
+
+        Returns:
+        - The ID of the journal entry.
+        """
+        path = os.path.normpath(path)
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT OR REPLACE INTO journal (path, directory, size, content_hash, artist, page_type, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, os.path.dirname(path), size, content_hash, artist, page_type, time.time()),
+            )
+            self.conn.commit()
+        return cursor.lastrowid
+
+    def pending(self, artist=None):
+        """
+        Return the entries that haven't been synced yet, oldest first.
+        """
+        query = "SELECT id, path, size, content_hash, artist, page_type FROM journal WHERE synced_at IS NULL"
+        params = ()
+        if artist is not None:
+            query += " AND artist = ?"
+            params = (artist,)
+        with self.lock:
+            rows = self.conn.execute(query + " ORDER BY id", params).fetchall()
+        return [JournalEntry(*row) for row in rows]
+
+    def directory_synced(self, directory):
+        """
+        Check whether any file of a directory has been synced before.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM journal WHERE directory = ? AND synced_at IS NOT NULL LIMIT 1",
+                (os.path.normpath(directory),),
+            ).fetchone()
+        return row is not None
+
+    def synced_path_for_hash(self, content_hash):
+        """
+        Return the path of an already synced file with the given content hash, or None.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT path FROM journal WHERE content_hash = ? AND synced_at IS NOT NULL ORDER BY id LIMIT 1",
+                (content_hash,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def mark_synced(self, entry_ids):
+        now = time.time()
+        with self.lock:
+            self.conn.executemany("UPDATE journal SET synced_at = ? WHERE id = ?", [(now, entry_id) for entry_id in entry_ids])
+            self.conn.commit()
+
+    def mark_folder_synced(self, folder, before=None):
+        """
+        Mark the pending entries of every file under a folder as synced, e.g. after the folder was reconciled as a whole.
+
+        Args:
+        - folder: The local folder, in the same form as the recorded paths (e.g. "downloaded_images/artist").
+        - before: Only mark the entries recorded before this time, as later files may have been missed.
+
+        Returns:
+        - The number of entries marked as synced.
+        """
+        prefix = os.path.join(os.path.normpath(folder), "")
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE journal SET synced_at = ? WHERE synced_at IS NULL AND substr(path, 1, ?) = ? AND created_at <= ?",
+                (time.time(), len(prefix), prefix, time.time() if before is None else before),
+            )
+            self.conn.commit()
+        return cursor.rowcount
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,121 @@
+import os
+import logging
+import sqlite3
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class SeenUrlStore:
+    """
+    Persistent index of image URLs that have already been downloaded.
+
+    Every URL is stored once per page type together with the time it was added and the artist it
+    was scraped for. Membership checks are primary-key lookups, new URLs are appended without
+    rewriting the rest of the index, and trimming evicts the oldest URLs first. The store can be
+    shared between threads; all access goes through one connection guarded by a lock.
+    """
+
+    def __init__(self, path="saved_urls.db"):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS seen_urls (
+                page_type TEXT NOT NULL,
+                url TEXT NOT NULL,
+                artist TEXT,
+                added_at REAL NOT NULL,
+                PRIMARY KEY (page_type, url)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS seen_urls_added_at ON seen_urls (page_type, added_at)")
+        self.conn.commit()
+
+    def contains(self, url, page_type):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM seen_urls WHERE page_type = ? AND url = ?", (page_type, url)
+            ).fetchone()
+        return row is not None
+
+    def filter_seen(self, urls, page_type):
+        """
+        Return the subset of the given URLs that are already in the index.
+        """
+        return {url for url in urls if self.contains(url, page_type)}
+
+    def add(self, urls, page_type, artist=None):
+        """
+        Append URLs to the index. URLs that are already present keep their original insertion time.
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO seen_urls (page_type, url, artist, added_at) VALUES (?, ?, ?, ?)",
+                [(page_type, url, artist, now) for url in urls],
+            )
+            self.conn.commit()
+
+    def count(self, page_type):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM seen_urls WHERE page_type = ?", (page_type,)).fetchone()[0]
+
+    def added_times(self, artist, page_type, limit=500):
+        """
+        Return the times the most recent URLs of an artist's page were added, newest first.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT added_at FROM seen_urls WHERE page_type = ? AND artist = ? ORDER BY added_at DESC LIMIT ?",
+                (page_type, artist, limit),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def trim(self, page_type, max_urls=1000):
+        """
+        Trim the index to keep only the most recent URLs of a page type.
+
+        Args:
+        - page_type: The page type ("feed" or "artist") to trim.
+        - max_urls: The maximum number of URLs to retain. The oldest URLs beyond this number will be removed.
+        """
+        with self.lock:
+            removed_urls = [row[0] for row in self.conn.execute(
+                "SELECT url FROM seen_urls WHERE page_type = ? ORDER BY added_at DESC, rowid DESC LIMIT -1 OFFSET ?",
+                (page_type, max_urls),
+            )]
+            if not removed_urls:
+                return
+
+            self.conn.executemany(
+                "DELETE FROM seen_urls WHERE page_type = ? AND url = ?",
+                [(page_type, url) for url in removed_urls],
+            )
+            self.conn.commit()
+
+        logging.info(f"Removing {len(removed_urls)} URLs:")
+        for url in removed_urls:
+            logging.info(url)
+        logging.info(f"Trimmed saved {page_type} URLs to the last {max_urls} entries.")
+
+    def import_legacy_file(self, page_type, filename=None):
+        """
+        Import a legacy `<page_type>_saved_urls.txt` file into the index and rename it so it is only imported once.
+        """
+        if filename is None:
+            filename = f"{page_type}_saved_urls.txt"
+        if not os.path.exists(filename):
+            return
+
+        with open(filename, 'r') as f:
+            urls = [line.strip().split('?')[0] for line in f if line.strip()]
+        self.add(urls, page_type)
+        os.rename(filename, f"{filename}.imported")
+        logging.info(f"Imported {len(urls)} URLs from {filename} into {self.path}.")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
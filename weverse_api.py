@@ -0,0 +1,167 @@
+import base64
+import hashlib
+import hmac
+import logging
+import time
+from urllib.parse import urlencode, urlparse
+
+import requests
+
+from metrics import metrics
+from rate_limit import rate_limits
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_API_BASE = "https://global.apis.naver.com/weverse/wevweb"
+DEFAULT_APP_ID = "be4d79eb8fc7bd008ee82c8ec4ff6fd4"
+
+# Paths of the JSON endpoints used by the Weverse web app
+COMMUNITY_ID_PATH = "/community/v1.0/communityIdUrlPathByUrlPathArtistCode"
+POST_LIST_PATHS = {
+    "feed": "/post/v1.0/community-{community_id}/feedTab",
+    "artist": "/post/v1.0/community-{community_id}/artistTabPosts",
+}
+POST_PATH = "/post/v1.0/post-{post_id}"
+VIDEO_PLAY_INFO_PATH = "/video/v1.1/vod/{video_id}/playInfo"
+
+
+class WeverseApiClient:
+    """
+    Client for the Weverse JSON API that reuses the authenticated browser session.
+
+    The cookies of the logged-in WebDriver are copied into a `requests` session, so the feed and
+    artist posts can be paged through with a cursor instead of scrolling the page. The base URL is
+    configurable, which allows pointing the client at a local stub server replaying recorded responses.
+    """
+
+    def __init__(self, session, base_url=DEFAULT_API_BASE, app_id=DEFAULT_APP_ID, hmac_key=None,
+                 language="en", page_size=20, timeout=30):
+        self.session = session
+        self.base_url = base_url.rstrip('/')
+        self.app_id = app_id
+        self.hmac_key = hmac_key
+        self.language = language
+        self.page_size = page_size
+        self.timeout = timeout
+        self._community_ids = {}
+
+    @classmethod
+    def from_driver(cls, driver, **kwargs):
+        """
+        Create a client from the cookies and user agent of a logged-in WebDriver.
+        """
+        session = requests.Session()
+        for cookie in driver.get_cookies():
+            session.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain"), path=cookie.get("path", "/"))
+
+        session.headers["User-Agent"] = driver.execute_script("return navigator.userAgent;")
+        session.headers["Referer"] = "https://weverse.io/"
+        session.headers["Origin"] = "https://weverse.io"
+
+        access_token = session.cookies.get("we2_access_token")
+        if access_token:
+            session.headers["Authorization"] = f"Bearer {access_token}"
+        else:
+            logging.warning("No Weverse access token cookie found. API requests may be rejected.")
+
+        return cls(session, **kwargs)
+
+    def _signed_params(self, path, params):
+        params = dict(params, appId=self.app_id, language=self.language, os="WEB", platform="WEB", wpf="pc")
+        if self.hmac_key:
+            # The web app signs each request with the path, query string and a timestamp
+            path_and_query = f"{urlparse(self.base_url).path}{path}?{urlencode(params)}"
+            timestamp = str(int(time.time() * 1000))
+            message = (path_and_query[:255] + timestamp).encode()
+            digest = hmac.new(self.hmac_key.encode(), message, hashlib.sha1).digest()
+            params["wmsgpad"] = timestamp
+            params["wmd"] = base64.b64encode(digest).decode()
+        return params
+
+    def get(self, path, params=None):
+        with metrics.timed("weverse_api"):
+            response = rate_limits.get("weverse_api").request(
+                self.session.get,
+                f"{self.base_url}{path}",
+                params=self._signed_params(path, params or {}),
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            return response.json()
+
+    def community_id(self, artist):
+        """
+        Resolve the numeric community ID of an artist from its URL path (e.g. "newjeansofficial").
+        """
+        if artist not in self._community_ids:
+            data = self.get(COMMUNITY_ID_PATH, {"keyword": artist})
+            self._community_ids[artist] = data["communityId"]
+        return self._community_ids[artist]
+
+    def iter_pages(self, artist, page_type, max_pages=50):
+        """
+        Yield the pages of posts of an artist's feed or artist page, newest first, following the paging cursor.
+
+        Args:
+        - artist: The artist's URL path.
+        - page_type: "feed" or "artist".
+        - max_pages: The maximum number of pages to request.
+        """
+        path = POST_LIST_PATHS[page_type].format(community_id=self.community_id(artist))
+        params = {"fieldSet": "postsV1", "limit": self.page_size, "pagingType": "CURSOR"}
+
+        for page in range(1, max_pages + 1):
+            data = self.get(path, params)
+            logging.info(f"Fetched page {page} of {artist}'s {page_type} posts ({len(data.get('data', []))} posts).")
+            yield data.get("data", [])
+
+            next_params = (data.get("paging") or {}).get("nextParams")
+            if not next_params:
+                return
+            params = dict(params, **next_params)
+
+        logging.warning(f"Reached maximum number of pages ({max_pages}) for {artist}'s {page_type} posts.")
+
+    def iter_posts(self, artist, page_type, max_pages=50):
+        """
+        Yield the posts of an artist's feed or artist page one by one, newest first. See `iter_pages`.
+        """
+        for posts in self.iter_pages(artist, page_type, max_pages=max_pages):
+            yield from posts
+
+    def post(self, post_id):
+        """
+        Fetch a single post with its full attachment list.
+        """
+        return self.get(POST_PATH.format(post_id=post_id), {"fieldSet": "postV1"})
+
+    def video_url(self, video_id):
+        """
+        Return the URL of the highest resolution encoding of a video, or None if it has no playable source.
+        """
+        data = self.get(VIDEO_PLAY_INFO_PATH.format(video_id=video_id), {"preview": "false"})
+        encodings = (((data.get("playInfo") or {}).get("videos") or {}).get("list")) or []
+        encodings = [encoding for encoding in encodings if encoding.get("source")]
+        if not encodings:
+            return None
+        best = max(encodings, key=lambda encoding: (encoding.get("encodingOption") or {}).get("height", 0))
+        return best["source"]
+
+    @staticmethod
+    def post_image_urls(post):
+        """
+        Return the URLs of the photos attached to a post, in their original resolution.
+        """
+        photos = (post.get("attachment") or {}).get("photo") or {}
+        return [photo["url"] for photo in photos.values() if photo.get("url")]
+
+    @staticmethod
+    def post_video_ids(post):
+        """
+        Return the IDs of the videos attached to a post.
+        """
+        videos = (post.get("attachment") or {}).get("video") or {}
+        return [str(video["videoId"]) for video in videos.values() if video.get("videoId")]
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,131 @@
+import logging
+import queue
+import threading
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+WEVERSE_URL = "https://weverse.io/"
+
+
+def export_session(driver):
+    """
+    Export the cookies and local storage of a logged-in WebDriver so other drivers can reuse the session.
+
+    Returns:
+    - A dict with the session's "cookies" and "local_storage".
+    """
+    if not driver.current_url.startswith(WEVERSE_URL):
+        driver.get(WEVERSE_URL)
+    return {
+        "cookies": driver.get_cookies(),
+        "local_storage": driver.execute_script("return Object.assign({}, window.localStorage);"),
+    }
+
+
+def import_session(driver, session_state):
+    """
+    Load a session exported with `export_session` into another WebDriver.
+    """
+    # Cookies and local storage can only be set for the origin that is currently open
+    driver.get(WEVERSE_URL)
+    for cookie in session_state["cookies"]:
+        cookie = {key: value for key, value in cookie.items() if key != "sameSite"}
+        try:
+            driver.add_cookie(cookie)
+        except Exception as e:
+            logging.debug(f"Skipping cookie {cookie.get('name')} for {cookie.get('domain')}: {e}")
+    driver.execute_script(
+        "for (const [key, value] of Object.entries(arguments[0])) { window.localStorage.setItem(key, value); }",
+        session_state["local_storage"],
+    )
+    driver.refresh()
+
+
+class BrowserWorkerPool:
+    """
+    Runs scraping jobs across several browsers that share one authenticated session.
+
+    Each worker thread owns its own WebDriver, created with `create_driver` and logged in by importing
+    the exported session, and takes (artist, page_type) jobs from a shared queue until it is empty.
+    Jobs left over because no worker could start run on the fallback driver, or are reported as failed.
+    """
+
+    def __init__(self, create_driver, session_state, workers=2):
+        self.create_driver = create_driver
+        self.session_state = session_state
+        self.workers = workers
+        # Starting several drivers at once races on patching the chromedriver binary
+        self._driver_lock = threading.Lock()
+
+    def _worker(self, worker_id, jobs, handler, failed_jobs, startup_errors):
+        with self._driver_lock:
+            logging.info(f"Starting browser worker {worker_id}...")
+            try:
+                driver = self.create_driver()
+                import_session(driver, self.session_state)
+            except Exception as e:
+                # The remaining workers keep draining the queue
+                logging.error(f"Failed to start browser worker {worker_id}: {e}")
+                startup_errors.append(e)
+                return
+
+        try:
+            while True:
+                try:
+                    artist, page_type = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                logging.info(f"Worker {worker_id} processing {artist}'s {page_type} page.")
+                try:
+                    handler(driver, artist, page_type)
+                except Exception as e:
+                    logging.error(f"Worker {worker_id} failed processing {artist}'s {page_type} page: {e}")
+                    failed_jobs.append((artist, page_type, e))
+        finally:
+            driver.quit()
+            logging.info(f"Stopped browser worker {worker_id}.")
+
+    def run(self, jobs, handler, fallback_driver=None):
+        """
+        Process all jobs and wait for the workers to finish.
+
+        Args:
+        - jobs: An iterable of (artist, page_type) tuples.
+        - handler: Called as handler(driver, artist, page_type) for each job.
+        - fallback_driver: An optional logged-in WebDriver that runs the jobs left over if no worker could start.
+
+        Returns:
+        - A list of (artist, page_type, exception) tuples for the jobs that failed.
+        """
+        job_queue = queue.Queue()
+        for job in jobs:
+            job_queue.put(job)
+
+        failed_jobs = []
+        startup_errors = []
+        threads = [
+            threading.Thread(target=self._worker, args=(worker_id, job_queue, handler, failed_jobs, startup_errors),
+                             daemon=True)
+            for worker_id in range(1, min(self.workers, job_queue.qsize()) + 1)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Jobs are only left over when every worker failed to start
+        while True:
+            try:
+                artist, page_type = job_queue.get_nowait()
+            except queue.Empty:
+                break
+            if fallback_driver is None:
+                failed_jobs.append((artist, page_type, startup_errors[-1]))
+                continue
+            logging.info(f"Processing {artist}'s {page_type} page in the main browser.")
+            try:
+                handler(fallback_driver, artist, page_type)
+            except Exception as e:
+                logging.error(f"Failed processing {artist}'s {page_type} page: {e}")
+                failed_jobs.append((artist, page_type, e))
+        return failed_jobs